@@ -1,16 +1,29 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string
 from flask_cors import CORS
 from PIL import Image
 import os
-from places365_model import Places365Model
+from places365_model import (Places365Model, DEFAULT_BACKBONE, DEFAULT_TOP_K, configure_threads,
+                             default_artifact_path, load_places365_labels)
+from track_catalog import TrackCatalog
+from scene_tags import SceneTagMap
+from spotify_client import SpotifyClient, MAX_IDS_PER_REQUEST
+from track_metadata_cache import TrackMetadataCache
+from preview_verifier import PreviewVerifier
+from inference_batcher import InferenceBatcher
+from scene_cache import SceneCache
+from model_loader import ModelLoader
+from process_memory import memory_usage
+from log_config import configure_logging, sample_request
+from stage_timing import server_timing_header, start_request, timed_stage
 import logging
+import contextvars
+import gc
 from dotenv import load_dotenv
 import io
-import gc
 import time
 import json
 import random
-import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
 
 # Scene to music style mapping
 STYLE_MAPPINGS = {
@@ -41,14 +54,20 @@ STYLE_MAPPINGS = {
     'general': ['pop', 'rock', 'electronic']
 }
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+load_dotenv()
+
+# Configure logging; production uses LOG_FORMAT=json and LOG_SAMPLE_RATE < 1
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+configure_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    fmt=os.getenv('LOG_FORMAT', 'text'),
+    sample_rate=LOG_SAMPLE_RATE
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Report per-request stage durations (decode, preprocess, inference, scoring, enrichment)
+# in a Server-Timing response header; benchmarks/load_test.py aggregates them
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
 
 app = Flask(__name__)
 
@@ -61,135 +80,275 @@ CORS(app, resources={
     }
 })
 
-# Enable debug mode
-app.debug = True
+# Debug mode (exceptions propagate, pretty-printed JSON) follows FLASK_DEBUG and is off unless it is set
 
 # Configure constants
-MAX_IMAGE_SIZE = (800, 800)  # Maximum image size
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_BATCH_IMAGES = 32  # Maximum images per /analyze_batch request
+MAX_TOP_K = 50  # Upper bound for the top_k request parameter
+
+# Bodies larger than a full /analyze_batch request get a 413 before the uploads are parsed
+MAX_REQUEST_SIZE = MAX_BATCH_IMAGES * MAX_FILE_SIZE + 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
 
 # 设置音乐数据文件路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-TRACKS_FILE = os.path.join(CURRENT_DIR, '..', 'public', 'downloads', 'spotify', 'tracks.json')
+TRACKS_FILE = os.getenv('TRACKS_FILE') or os.path.join(CURRENT_DIR, '..', 'public', 'downloads', 'spotify', 'tracks.json')
+# 检查 tracks.json 是否更新的间隔（秒）
+TRACKS_RELOAD_INTERVAL = float(os.getenv('TRACKS_RELOAD_INTERVAL', '5'))
+
+# Load music catalog once; requests read an immutable snapshot that is swapped on file change
+track_catalog = TrackCatalog(TRACKS_FILE, check_interval=TRACKS_RELOAD_INTERVAL)
+track_catalog.load()
+
+# Places365 label -> weighted tag ids, computed once against the catalog's tag vocabulary.
+# Uses the bundled labels file: importing the app fails fast rather than downloading it
+scene_tag_map = SceneTagMap(load_places365_labels(download=False), STYLE_MAPPINGS, track_catalog.vocabulary)
+
+# Image requests wait this long (seconds) for a model that is still loading before getting a 503
+MODEL_WAIT_TIMEOUT = float(os.getenv('MODEL_WAIT_TIMEOUT', '5'))
+MODEL_RETRY_AFTER = int(os.getenv('MODEL_RETRY_AFTER', '5'))
+# Scene classifier backbone, one of places365_model.BACKBONES
+MODEL_BACKBONE = os.getenv('MODEL_BACKBONE', DEFAULT_BACKBONE)
+# Set together with `gunicorn --preload`: build the model once in the master and share it with workers
+MODEL_PRELOAD = os.getenv('MODEL_PRELOAD', '0') == '1'
+
+
+def load_model():
+    """Build the model and its predictor; returns (model, scene_predictor)"""
+    model = Places365Model(
+        # A master that ran multi-threaded torch ops deadlocks its forked workers' thread pools
+        num_threads=1 if MODEL_PRELOAD else None,
+        quantization=os.getenv('MODEL_QUANTIZATION') or None,
+        calibration_dir=os.getenv('QUANTIZATION_CALIBRATION_DIR'),
+        artifact_path=os.getenv('MODEL_ARTIFACT', default_artifact_path(MODEL_BACKBONE)),
+        backbone=MODEL_BACKBONE
+    )
+
+    # Optional micro-batching of concurrent image requests into one forward pass
+    if os.getenv('INFERENCE_BATCHING', '0') == '1':
+        scene_predictor = InferenceBatcher(
+            model,
+            max_batch_size=int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '8')),
+            max_wait_ms=float(os.getenv('INFERENCE_MAX_WAIT_MS', '10'))
+        )
+        logger.info(f"Inference batching enabled: max batch {scene_predictor.max_batch_size}, "
+                    f"max wait {scene_predictor.max_wait * 1000:.0f}ms")
+    else:
+        scene_predictor = model
+    return model, scene_predictor
+
 
-# Initialize model
-try:
-    logger.info("Starting model initialization...")
-    model = Places365Model()
-    logger.info("Model initialization successful")
-except Exception as e:
-    logger.error(f"Model initialization failed: {str(e)}")
-    raise
+def after_fork_in_worker():
+    """Give a preloaded model the worker's own torch thread count"""
+    loaded = model_loader.wait(0)
+    if loaded is not None:
+        model, _ = loaded
+        model.num_threads, model.interop_threads = configure_threads()
+
+
+def warm_up():
+    """Exercise the model and the catalog scorer once, e.g. in a freshly forked gunicorn worker
+
+    Skips the model when it is not loaded yet; returns the time taken in ms.
+    """
+    start = time.perf_counter()
+    loaded = model_loader.wait(0)
+    if loaded is not None:
+        model, _ = loaded
+        model.warm_up()
+    catalog = track_catalog.snapshot()
+    if catalog is not None:
+        catalog.match(scene_tag_map.tag_weights([(scene_tag_map.labels[0], 1.0)]))
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    logger.info(f"worker warm-up took {elapsed_ms:.0f}ms (model {'ready' if loaded else 'not loaded'})")
+    return elapsed_ms
+
+
+model_loader = ModelLoader(load_model)
+if MODEL_PRELOAD:
+    preloaded = model_loader.load()
+    if preloaded is not None:
+        preloaded[0].share_memory()
+    # Keep the collector in workers from writing to (and un-sharing) the master's objects
+    gc.freeze()
+    os.register_at_fork(after_in_child=after_fork_in_worker)
+else:
+    # Load the model in the background so the server binds and serves text requests right away
+    model_loader.start()
+
+# 相同图片重复上传时直接返回缓存的场景结果
+scene_cache = SceneCache(
+    max_entries=int(os.getenv('SCENE_CACHE_SIZE', '1024')),
+    perceptual=os.getenv('SCENE_CACHE_PERCEPTUAL', '0') == '1'
+)
 
 # Spotify API 配置
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
-SPOTIFY_TOKEN_URL = 'https://accounts.spotify.com/api/token'
-SPOTIFY_API_BASE_URL = 'https://api.spotify.com/v1'
-
-# Spotify API 客户端
-class SpotifyClient:
-    def __init__(self):
-        self._access_token = None
-        self._token_expiry = 0
-        
-    def _get_access_token(self):
-        """获取 Spotify API 访问令牌"""
-        try:
-            response = requests.post(
-                SPOTIFY_TOKEN_URL,
-                data={
-                    'grant_type': 'client_credentials',
-                    'client_id': SPOTIFY_CLIENT_ID,
-                    'client_secret': SPOTIFY_CLIENT_SECRET,
-                },
-                headers={
-                    'Content-Type': 'application/x-www-form-urlencoded'
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data['access_token']
-        except Exception as e:
-            logger.error(f"获取 Spotify 访问令牌失败: {str(e)}")
-            return None
+# URL 可通过环境变量覆盖（例如指向本地 stub 服务器）
+SPOTIFY_TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+SPOTIFY_API_BASE_URL = os.getenv('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1')
 
-    def get_track_info(self, track_id):
-        """获取歌曲详细信息"""
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
+# 歌曲元数据缓存：条目数、TTL（秒），SPOTIFY_CACHE_PATH 设置后持久化到 sqlite
+track_metadata_cache = TrackMetadataCache(
+    max_size=int(os.getenv('SPOTIFY_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('SPOTIFY_CACHE_TTL', '86400')),
+    negative_ttl=float(os.getenv('SPOTIFY_CACHE_NEGATIVE_TTL', '3600')),
+    path=os.getenv('SPOTIFY_CACHE_PATH') or None
+)
+
+# 初始化 Spotify 客户端
+spotify_client = SpotifyClient(
+    SPOTIFY_CLIENT_ID,
+    SPOTIFY_CLIENT_SECRET,
+    api_base_url=SPOTIFY_API_BASE_URL,
+    token_url=SPOTIFY_TOKEN_URL,
+    cache=track_metadata_cache,
+    pool_size=int(os.getenv('SPOTIFY_POOL_SIZE', '10'))
+)
+# 预览 URL 在后台验证，请求只读取最近一次的结果
+spotify_client.preview_verifier = PreviewVerifier(
+    session=spotify_client.session,
+    ttl=float(os.getenv('PREVIEW_VERIFY_TTL', '86400'))
+)
+
+# Spotify enrichment fan-out: bounded worker pool and per-request deadline (seconds)
+SPOTIFY_MAX_WORKERS = int(os.getenv('SPOTIFY_MAX_WORKERS', '8'))
+ENRICHMENT_DEADLINE = float(os.getenv('ENRICHMENT_DEADLINE', '3'))
+enrichment_executor = ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS,
+                                         thread_name_prefix='spotify-enrich')
+
+
+def iter_enrichment(track_ids, timeout=ENRICHMENT_DEADLINE, lookup=None):
+    """Yield {track_id: info} for each batch of tracks as its Spotify lookup finishes, until the deadline
+
+    Batches of up to 50 ids are looked up in parallel with `lookup`
+    (default spotify_client.get_tracks_info); batches still running at the
+    deadline are dropped.
+    """
+    lookup = lookup or spotify_client.get_tracks_info
+    track_ids = list(dict.fromkeys(track_ids))
+    # Run each lookup in a copy of the request's context so the client's logs
+    # follow this request's LOG_SAMPLE_RATE decision
+    futures = {
+        enrichment_executor.submit(contextvars.copy_context().run, lookup, chunk): chunk
+        for chunk in (track_ids[i:i + MAX_IDS_PER_REQUEST]
+                      for i in range(0, len(track_ids), MAX_IDS_PER_REQUEST))
+    }
+    if not futures:
+        return
+
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
             try:
-                if not self._access_token:
-                    self._access_token = self._get_access_token()
-                
-                if not self._access_token:
-                    logger.error("无法获取 Spotify 访问令牌")
-                    return None
-                
-                response = requests.get(
-                    f"{SPOTIFY_API_BASE_URL}/tracks/{track_id}",
-                    headers={
-                        'Authorization': f'Bearer {self._access_token}'
-                    }
-                )
-                
-                # 如果令牌过期，重新获取
-                if response.status_code == 401:
-                    logger.info("访问令牌过期，重新获取")
-                    self._access_token = self._get_access_token()
-                    retry_count += 1
-                    continue
-                
-                response.raise_for_status()
-                track_data = response.json()
-                
-                # 获取最大尺寸的专辑封面
-                album_images = track_data.get('album', {}).get('images', [])
-                album_image_url = None
-                if album_images:
-                    # 按宽度排序，获取最大的图片
-                    album_images.sort(key=lambda x: x.get('width', 0), reverse=True)
-                    album_image_url = album_images[0].get('url')
-                
-                # 获取预览 URL
-                preview_url = track_data.get('preview_url')
-                if preview_url:
-                    # 验证预览 URL 是否可访问
-                    try:
-                        preview_response = requests.head(preview_url, timeout=2)
-                        if preview_response.status_code != 200:
-                            logger.warning(f"预览 URL 不可访问: {preview_url}")
-                            preview_url = None
-                    except Exception as e:
-                        logger.warning(f"检查预览 URL 时出错: {str(e)}")
-                        preview_url = None
-                
-                logger.info(f"成功获取歌曲信息 - Track ID: {track_id}, "
-                          f"专辑封面: {'有' if album_image_url else '无'}, "
-                          f"预览: {'有' if preview_url else '无'}")
-                
-                return {
-                    'album_image_url': album_image_url,
-                    'preview_url': preview_url
-                }
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"请求 Spotify API 失败 (尝试 {retry_count + 1}/{max_retries}): {str(e)}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    time.sleep(1)  # 等待1秒后重试
-                continue
+                yield future.result()
             except Exception as e:
-                logger.error(f"获取歌曲信息时发生错误: {str(e)}")
-                return None
-        
-        logger.error(f"获取歌曲信息失败，已达到最大重试次数: {track_id}")
-        return None
+                logger.error(f"spotify enrichment failed for {len(futures[future])} tracks: {str(e)}")
+    except FuturesTimeoutError:
+        for future in pending:
+            future.cancel()  # drop work that has not started yet
+        missed = sum(len(futures[future]) for future in pending)
+        logger.warning(f"spotify enrichment missed the {timeout}s deadline for {missed} tracks")
+
+
+def enrich_tracks(track_ids, timeout=ENRICHMENT_DEADLINE):
+    """Fetch Spotify info for tracks in batches, returning only what finished before the deadline"""
+    track_infos = {}
+    for batch in iter_enrichment(track_ids, timeout):
+        track_infos.update(batch)
+    return track_infos
+
+
+def match_scenes(catalog, scenes, limit=12):
+    """Find the catalog tracks whose tags best match the scenes, weighted by scene probability"""
+    with timed_stage('scoring'):
+        logger.info(f"using catalog of {len(catalog)} tracks")
+
+        # image scenes are Places365 labels with a precomputed tag table; text is split into words
+        image_scenes = []
+        tag_weights = {}
+        for scene in scenes:
+            if scene.get('source') != 'text' and scene['scene'] in scene_tag_map:
+                image_scenes.append((scene['scene'], scene['probability']))
+                continue
+            text_tags = scene['scene'].lower().split()
+            logger.info(f"text tags: {text_tags}")
+            for tag_id, weight in catalog.tag_weights(text_tags, scene['probability']).items():
+                tag_weights[tag_id] = tag_weights.get(tag_id, 0.0) + weight
+
+        for tag_id, weight in scene_tag_map.tag_weights(image_scenes).items():
+            tag_weights[tag_id] = tag_weights.get(tag_id, 0.0) + weight
+        logger.info(f"query: {len(image_scenes)} scene labels, {len(tag_weights)} weighted tags")
+
+        # one sparse matrix-vector product over the catalog's track x tag matrix
+        matched_tracks = catalog.match(tag_weights, limit=limit)
+        logger.info(f"selected {len(matched_tracks)} tracks with highest match score")
+        return matched_tracks
+
+
+def format_track(track, score, match_count, matched_tags, track_info, pos):
+    """Build the playlist entry returned to the client"""
+    track_id = track.uri.split(':')[-1]
+    album_image_url = (track_info.get('album_image_url')
+                       if track_info and track_info.get('album_image_url')
+                       else '/default-album.png')
+    preview_url = track_info.get('preview_url') if track_info else None
+
+    return {
+        'id': track.uri,
+        'name': track.name,
+        'artist': track.artist,
+        'albumName': track.album,
+        'duration': track.duration_ms,
+        'pos': pos,
+        'albumImageUrl': album_image_url,
+        'spotifyUrl': f"https://open.spotify.com/track/{track_id}" if track_id else None,
+        'previewUrl': preview_url,
+        'matchScore': round(score, 4),
+        'matchCount': match_count,
+        'matchedTags': matched_tags
+    }
+
+
+def spotify_track_ids(matched_tracks):
+    """Spotify ids of matched tracks, skipping tracks without one"""
+    track_ids = (track.uri.split(':')[-1] for track, _, _, _ in matched_tracks)
+    return [track_id for track_id in track_ids if track_id]
+
+
+def build_playlist(matched_tracks, track_infos):
+    """Format matched tracks with whatever Spotify info arrived; missing info falls back to defaults"""
+    playlist = []
+    for track, score, match_count, matched_tags in matched_tracks:
+        try:
+            track_info = track_infos.get(track.uri.split(':')[-1])
+            playlist.append(format_track(track, score, match_count, matched_tags, track_info,
+                                         len(playlist)))
+        except Exception as e:
+            logger.error(f"error processing single track: {str(e)}")
+            continue
+    logger.info(f"Final selected {len(playlist)} recommended songs")
+    return playlist
+
+
+def recommend_playlist(catalog, scenes):
+    """Match tracks for the scenes and enrich them with Spotify info; returns [] on failure"""
+    try:
+        matched_tracks = match_scenes(catalog, scenes)
+
+        # get track info for the whole playlist at once; late tracks fall back to defaults
+        with timed_stage('enrichment'):
+            track_infos = enrich_tracks(spotify_track_ids(matched_tracks))
+        return build_playlist(matched_tracks, track_infos)
+    except Exception as e:
+        logger.error(f"Music recommendation failed: {str(e)}")
+        logger.error(f"Error details: {e.__class__.__name__}: {str(e)}")
+        logger.error(f"Current working directory: {os.getcwd()}")
+        return []
 
-# 初始化 Spotify 客户端
-spotify_client = SpotifyClient()
 
 # HTML test page
 HTML_TEMPLATE = '''
@@ -515,7 +674,10 @@ def test():
     return "Server is running"
 
 def process_image(image_file):
-    """Process uploaded image, including size check and compression"""
+    """Process uploaded image: size check, format check and a reduced-size RGB decode
+
+    Raises ValueError for any upload that can't be used (too large, unsupported, corrupt).
+    """
     try:
         logger.info("开始处理图片...")
         # Check file size
@@ -533,43 +695,19 @@ def process_image(image_file):
         logger.info(f"图片格式: {image.format}, 尺寸: {image.size}, 模式: {image.mode}")
         
         # Check image format
-        if image.format not in ['JPEG', 'PNG', 'WebP']:
+        if image.format not in ['JPEG', 'PNG', 'WEBP']:
             raise ValueError(
                 'Unsupported image format. Please use JPEG, PNG or WebP'
             )
             
-        # Convert to RGB mode (if needed) and immediately release original image
-        if image.mode != 'RGB':
-            logger.info(f"转换图片模式从 {image.mode} 到 RGB")
-            new_image = image.convert('RGB')
-            image.close()
-            image = new_image
-            
-        # If image is too large, resize it
-        if (image.size[0] > MAX_IMAGE_SIZE[0] or 
-            image.size[1] > MAX_IMAGE_SIZE[1]):
-            # Calculate resize ratio
-            ratio = min(
-                MAX_IMAGE_SIZE[0] / image.size[0],
-                MAX_IMAGE_SIZE[1] / image.size[1]
-            )
-            new_size = (
-                int(image.size[0] * ratio),
-                int(image.size[1] * ratio)
-            )
-            logger.info(f"调整图片尺寸从 {image.size} 到 {new_size}")
-            # Resize and immediately release original image
-            new_image = image.resize(new_size, Image.Resampling.LANCZOS)
-            image.close()
-            image = new_image
+        # JPEG draft / integer reduce to just above the model's resize size, as RGB;
+        # the model then resizes once straight to its input
+        image = Places365Model.decode(image)
+        logger.info(f"解码尺寸: {image.size}")
             
-        # Force load image data into memory and release file handle
-        image.load()
+        # Release file handle (decode() has loaded the pixels)
         image_file.close()
         
-        # Active garbage collection
-        gc.collect()
-        
         logger.info("图片处理完成")
         return image
     except Exception as e:
@@ -578,8 +716,87 @@ def process_image(image_file):
             image_file.close()
         if 'image' in locals():
             image.close()
-        gc.collect()
-        raise
+        if isinstance(e, ValueError):
+            raise
+        # PIL reports corrupt or truncated files with assorted errors; they are all bad input
+        raise ValueError(str(e)) from e
+
+def read_image_bytes(image_file):
+    """Read an upload into memory after checking its size"""
+    image_file.seek(0, io.SEEK_END)
+    file_size = image_file.tell()
+    image_file.seek(0)
+    if file_size > MAX_FILE_SIZE:
+        raise ValueError('Image file too large (max 5MB)')
+    image_bytes = image_file.read()
+    image_file.close()
+    return image_bytes
+
+def model_unavailable():
+    """503 response for image requests that arrive before the model is ready"""
+    if model_loader.state == ModelLoader.FAILED:
+        error = f'model failed to load: {model_loader.error}'
+    else:
+        error = 'model is still loading, please retry'
+    return {
+        'error': error,
+        'modelState': model_loader.state,
+        'success': False
+    }, 503, {'Retry-After': str(MODEL_RETRY_AFTER)}
+
+def prediction_params(values):
+    """Read top_k and min_probability from the request; raises ValueError when out of range"""
+    try:
+        k = int(values.get('top_k', DEFAULT_TOP_K))
+        min_probability = float(values.get('min_probability', 0.0))
+    except ValueError:
+        raise ValueError('top_k must be an integer and min_probability a number')
+    if not 1 <= k <= MAX_TOP_K:
+        raise ValueError(f'top_k must be between 1 and {MAX_TOP_K}')
+    if not 0.0 <= min_probability <= 1.0:
+        raise ValueError('min_probability must be between 0 and 1')
+    return k, min_probability
+
+def predict_upload(image_file, scene_predictor, k=DEFAULT_TOP_K, min_probability=0.0):
+    """Predict scenes for an uploaded image, answering repeated uploads from the scene cache"""
+    params = (k, min_probability)
+    image_bytes = read_image_bytes(image_file)
+    content_key = scene_cache.content_key(image_bytes, params)
+    scenes = scene_cache.get(content_key)
+    if scenes is not None:
+        logger.info("scene cache hit, skipping decode and inference")
+        return scenes
+
+    with timed_stage('decode'):
+        image = process_image(io.BytesIO(image_bytes))
+    logger.info(f"image processed: {image.size}")
+    perceptual_key = scene_cache.perceptual_key(image, params)
+    scenes = scene_cache.get(perceptual_key)
+    if scenes is None:
+        # Analyze image
+        logger.info("starting scene analysis...")
+        scenes = scene_predictor.predict(image, k=k, min_probability=min_probability)
+    if scenes:
+        scene_cache.put(scenes, content_key, perceptual_key)
+    return scenes
+
+@app.before_request
+def before_request():
+    """Pick whether this request's INFO logs are kept (LOG_SAMPLE_RATE) and start stage timings"""
+    sample_request(LOG_SAMPLE_RATE)
+    if SERVER_TIMING:
+        start_request()
+
+def cors_headers(origin):
+    """CORS response headers echoing the request's Origin"""
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Access-Control-Allow-Methods': 'POST, OPTIONS, GET',
+        'Access-Control-Allow-Headers': 'Content-Type, Accept, Origin',
+        'Access-Control-Expose-Headers': 'Content-Type',
+        'Access-Control-Max-Age': '3600',
+        'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0'
+    }
 
 @app.after_request
 def after_request(response):
@@ -588,14 +805,11 @@ def after_request(response):
     
     # Allow local development and production environments
     if origin:
-        response.headers.update({
-            'Access-Control-Allow-Origin': origin,
-            'Access-Control-Allow-Methods': 'POST, OPTIONS, GET',
-            'Access-Control-Allow-Headers': 'Content-Type, Accept, Origin',
-            'Access-Control-Expose-Headers': 'Content-Type',
-            'Access-Control-Max-Age': '3600',
-            'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0'
-        })
+        response.headers.update(cors_headers(origin))
+
+    server_timing = server_timing_header() if SERVER_TIMING else None
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
     
     # Handle preflight request
     if request.method == 'OPTIONS':
@@ -603,206 +817,325 @@ def after_request(response):
     
     return response
 
+def parse_analyze_request(files, form, values):
+    """Validate the fields of an analyze request; shared by the Flask and ASGI views
+
+    Returns (image file or None, (k, min_probability), None), or
+    (None, None, error response) for a bad request.
+    """
+    if 'image' not in files and 'text' not in form:
+        logger.error("no image or text in request")
+        return None, None, ({
+            'error': 'please provide an image or text description',
+            'success': False
+        }, 400)
+
+    image_file = files.get('image')
+    if image_file is None:
+        return None, None, None
+    if not image_file.filename:
+        logger.error("image file name is empty")
+        return None, None, ({
+            'error': 'invalid image file',
+            'success': False
+        }, 400)
+
+    try:
+        params = prediction_params(values)
+    except ValueError as e:
+        return None, None, ({
+            'error': str(e),
+            'success': False
+        }, 400)
+    return image_file, params, None
+
+def image_scenes(image_file, scene_predictor, k=DEFAULT_TOP_K, min_probability=0.0):
+    """Scenes predicted for an uploaded image, marked with source 'image'
+
+    Returns (scenes, None), or (None, error response) for an upload that
+    can't be decoded. Inference errors are raised.
+    """
+    try:
+        logger.info(f"processing image: {image_file.filename}")
+        scenes = predict_upload(image_file, scene_predictor, k, min_probability)
+    except ValueError as e:
+        # A bad upload is the client's error; inference failures propagate as a 500
+        logger.error(f"image processing failed: {str(e)}")
+        return None, ({
+            'error': f'image processing failed: {str(e)}',
+            'success': False
+        }, 400)
+    logger.info(f"scene analysis completed: {scenes}")
+
+    # Add source marker
+    for scene in scenes:
+        scene['source'] = 'image'
+    return scenes, None
+
+def add_text_scene(scenes, form):
+    """Append the request's text (used directly as a scene) to the image scenes
+
+    Returns (scenes, None), or (None, error response) when there is no scene at all.
+    """
+    text = form.get('text', '').strip()
+    if text:
+        text_scene = {
+            'scene': text,
+            'probability': 1.0,
+            'source': 'text'
+        }
+        scenes.append(text_scene)
+        logger.info(f"Added text scene: {text_scene}")
+
+    if not scenes:
+        logger.warning("No scenes generated")
+        return None, ({
+            'error': 'Unable to recognize scene',
+            'success': False
+        }, 400)
+    return scenes, None
+
+def catalog_unavailable():
+    """500 response for requests that arrive while no music catalog is loaded"""
+    return {
+        'error': track_catalog.error or 'no available music data',
+        'success': False
+    }, 500
+
+def analyze_response(scenes, playlist):
+    """Body of a successful /analyze response"""
+    logger.info(f"Returning response: {len(scenes)} scenes, {len(playlist)} tracks")
+    return {
+        'success': True,
+        'scenes': scenes,
+        'styles': [],  # No longer return style list
+        'playlist': playlist
+    }
+
+def request_scenes():
+    """Scenes for the image and/or text of the current analyze request
+
+    Returns (scenes, None), or (None, error response) for a bad request or a
+    model that is not ready yet. Inference errors are raised.
+    """
+    image_file, params, error = parse_analyze_request(request.files, request.form, request.values)
+    if error is not None:
+        return None, error
+
+    scenes = []
+    if image_file is not None:
+        loaded = model_loader.wait(MODEL_WAIT_TIMEOUT)
+        if loaded is None:
+            logger.warning(f"model not ready ({model_loader.state}), rejecting image request")
+            return None, model_unavailable()
+        _, scene_predictor = loaded
+
+        scenes, error = image_scenes(image_file, scene_predictor, *params)
+        if error is not None:
+            return None, error
+
+    return add_text_scene(scenes, request.form)
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     logger.info("received analyze request")
-    logger.debug(f"request headers: {dict(request.headers)}")
-    logger.debug(f"file: {request.files}")
-    logger.debug(f"form data: {request.form}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"request headers: {dict(request.headers)}")
+        logger.debug(f"file: {request.files}")
+        logger.debug(f"form data: {request.form}")
     
     try:
-        if 'image' not in request.files and 'text' not in request.form:
-            logger.error("no image or text in request")
+        scenes, error = request_scenes()
+        if error is not None:
+            return error
+
+        # Get music recommendation
+        catalog = track_catalog.snapshot()
+        if catalog is None:
+            return catalog_unavailable()
+        playlist = recommend_playlist(catalog, scenes)
+
+        response_data = analyze_response(scenes, playlist)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Response data: {response_data}")
+        return jsonify(response_data)
+        
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Server error: {str(e)}',
+            'success': False
+        }), 500
+
+def playlist_events(catalog, scenes):
+    """Events of a streamed analyze response, each sent as soon as its data exists
+
+    'scenes' first, then 'playlist' with the scored tracks and default
+    artwork, then one 'track' per enriched track carrying its Spotify
+    artwork and preview, cached tracks first. 'done' (or 'error') ends the stream.
+    """
+    try:
+        yield 'scenes', {'scenes': scenes}
+
+        matched_tracks = match_scenes(catalog, scenes)
+        playlist = build_playlist(matched_tracks, {})
+        yield 'playlist', {'playlist': playlist}
+
+        tracks = {}
+        for entry, (track, score, match_count, matched_tags) in zip(playlist, matched_tracks):
+            tracks.setdefault(track.uri.split(':')[-1], []).append((entry['pos'], track, score,
+                                                                    match_count, matched_tags))
+
+        def track_events(track_infos):
+            for track_id, track_info in track_infos.items():
+                if not track_info:
+                    continue
+                for pos, track, score, match_count, matched_tags in tracks.get(track_id, ()):
+                    entry = format_track(track, score, match_count, matched_tags, track_info, pos)
+                    yield 'track', {key: entry[key] for key in ('pos', 'id', 'albumImageUrl', 'previewUrl')}
+
+        cached, missing = spotify_client.cached_tracks_info(spotify_track_ids(matched_tracks))
+        yield from track_events(cached)
+        for track_infos in iter_enrichment(missing, lookup=spotify_client.fetch_tracks_info):
+            yield from track_events(track_infos)
+
+        yield 'done', {'success': True}
+    except Exception as e:
+        logger.error(f"Error streaming analyze response: {str(e)}", exc_info=True)
+        yield 'error', {'error': f'Server error: {str(e)}', 'success': False}
+
+def format_event(event, data, sse):
+    """One event as a Server-Sent Events message or as an NDJSON line"""
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({'event': event, **data}, ensure_ascii=False) + '\n'
+
+@app.route('/analyze_stream', methods=['POST'])
+def analyze_stream():
+    """/analyze as a stream of events: scenes, then the playlist, then per-track Spotify info
+
+    NDJSON by default; Server-Sent Events when the client accepts text/event-stream.
+    Request errors are reported like /analyze, before the stream starts.
+    """
+    logger.info("received analyze_stream request")
+    try:
+        scenes, error = request_scenes()
+        if error is not None:
+            return error
+        catalog = track_catalog.snapshot()
+        if catalog is None:
+            return catalog_unavailable()
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Server error: {str(e)}',
+            'success': False
+        }), 500
+
+    sse = request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+    events = (format_event(event, data, sse) for event, data in playlist_events(catalog, scenes))
+    return Response(events, mimetype='text/event-stream' if sse else 'application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # stop reverse proxies from buffering the stream
+    })
+
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Classify many images in one request; optionally build one playlist for all of them"""
+    logger.info("received analyze_batch request")
+
+    try:
+        image_files = [f for f in request.files.getlist('images') if f.filename]
+        if not image_files:
+            return jsonify({
+                'error': 'please provide one or more images',
+                'success': False
+            }), 400
+        if len(image_files) > MAX_BATCH_IMAGES:
+            return jsonify({
+                'error': f'too many images (max {MAX_BATCH_IMAGES})',
+                'success': False
+            }), 400
+        try:
+            k, min_probability = prediction_params(request.values)
+        except ValueError as e:
             return jsonify({
-                'error': 'please provide an image or text description',
+                'error': str(e),
                 'success': False
             }), 400
+        params = (k, min_probability)
 
-        # Process image
-        scenes = []
-        if 'image' in request.files:
-            image_file = request.files['image']
-            if not image_file.filename:
-                logger.error("image file name is empty")
-                return jsonify({
-                    'error': 'invalid image file',
-                    'success': False
-                }), 400
+        loaded = model_loader.wait(MODEL_WAIT_TIMEOUT)
+        if loaded is None:
+            logger.warning(f"model not ready ({model_loader.state}), rejecting batch request")
+            return model_unavailable()
+        model, _ = loaded
 
+        # Each upload that isn't cached is decoded, preprocessed into its row of the input
+        # batch and closed, so only one decoded image is held at a time; a bad file only
+        # fails its own entry
+        results = []
+        pending = []  # (result, cache keys) for the filled rows of input_batch
+        input_batch = model.new_batch(len(image_files))
+        for image_file in image_files:
+            result = {'filename': image_file.filename, 'success': True}
+            results.append(result)
             try:
-                logger.info(f"processing image: {image_file.filename}")
-                image = process_image(image_file)
-                logger.info(f"image processed: {image.size}")
-                
-                # Analyze image
-                logger.info("starting scene analysis...")
-                scenes = model.predict(image)
-                logger.info(f"scene analysis completed: {scenes}")
-                
-                # Add source marker
-                for scene in scenes:
-                    scene['source'] = 'image'
-                
+                image_bytes = read_image_bytes(image_file)
+                content_key = scene_cache.content_key(image_bytes, params)
+                scenes = scene_cache.get(content_key)
+                if scenes is None:
+                    with timed_stage('decode'):
+                        image = process_image(io.BytesIO(image_bytes))
+                    try:
+                        perceptual_key = scene_cache.perceptual_key(image, params)
+                        scenes = scene_cache.get(perceptual_key)
+                        if scenes is None:
+                            with timed_stage('preprocess'):
+                                model.preprocess(image, out=input_batch[len(pending)])
+                            pending.append((result, content_key, perceptual_key))
+                            continue
+                    finally:
+                        image.close()
+                result['scenes'] = scenes
             except Exception as e:
-                logger.error(f"image processing or analysis failed: {str(e)}", exc_info=True)
-                return jsonify({
-                    'error': f'image processing failed: {str(e)}',
-                    'success': False
-                }), 400
-
-        # Process text
-        if 'text' in request.form:
-            text = request.form['text'].strip()
-            if text:
-                # Simple text analysis: directly use text as scene
-                text_scene = {
-                    'scene': text,
-                    'probability': 1.0,
-                    'source': 'text'
-                }
-                scenes.append(text_scene)
-                logger.info(f"Added text scene: {text_scene}")
+                logger.error(f"image processing failed for {image_file.filename}: {str(e)}")
+                result['success'] = False
+                result['error'] = f'image processing failed: {str(e)}'
 
-        if not scenes:
-            logger.warning("No scenes generated")
-        return jsonify({
-                'error': 'Unable to recognize scene',
-            'success': False
-        }), 400
+        # One batched forward pass for all images that missed the cache; a failure is a 500
+        if pending:
+            with timed_stage('inference'):
+                predictions = model.predict_tensors(input_batch[:len(pending)], k, min_probability)
+            for (result, content_key, perceptual_key), scenes in zip(pending, predictions):
+                if scenes:
+                    scene_cache.put(scenes, content_key, perceptual_key)
+                result['scenes'] = scenes
+        del pending, input_batch
 
-        # Get music recommendation
-        try:
-            seen_track_uris = set()
-            logger.info(f"attempting to read music data file: {TRACKS_FILE}")
-            if not os.path.exists(TRACKS_FILE):
-                logger.error(f"music data file does not exist: {TRACKS_FILE}")
-                return jsonify({
-                    'error': 'music data file does not exist',
-                    'success': False
-                }), 500
-            
-            with open(TRACKS_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError as e:
-                    logger.error(f"music data file format error: {str(e)}")
-                    return jsonify({
-                        'error': 'music data file format error',
-                        'success': False
-                    }), 500
-                    
-                playlists = data.get('playlists', [])
-                if not playlists:
-                    logger.warning("music data file has no playlists")
-                    return jsonify({
-                        'error': 'no available music data',
-                        'success': False
-                    }), 500
-                
-                # collect all tracks
-                all_tracks = []
-                for playlist in playlists:
-                    tracks = playlist.get('tracks', [])
-                    all_tracks.extend(tracks)
-                
-                logger.info(f"loaded {len(all_tracks)} tracks")
-                
-                # extract tags from scenes
-                input_tags = []
-                for scene in scenes:
-                    scene_tags = scene['scene'].lower().split()
-                    input_tags.extend(scene_tags)
-                
-                logger.info(f"input tags: {input_tags}")
-                
-                # calculate match score for each track
-                scored_tracks = []
-                for track in all_tracks:
-                    if isinstance(track, str):
-                        continue
-                    
-                    track_uri = track.get('track_uri')
-                    if not track_uri or track_uri in seen_track_uris:
-                        continue
-                        
-                    track_tags = track.get('tags', [])
-                    logger.info(f"\nchecking track: {track.get('track_name', 'Unknown')}")
-                    logger.info(f"track tags: {track_tags}")
-                    
-                    # calculate match count
-                    matched_tags = [tag for tag in track_tags if tag.lower() in input_tags]
-                    match_count = len(matched_tags)
-                    
-                    if match_count > 0:  # only add tracks with matches
-                        scored_tracks.append({
-                            **track,
-                            'match_count': match_count,
-                            'matched_tags': matched_tags
-                        })
-                        seen_track_uris.add(track_uri)  # record added tracks
-                
-                # sort by match count
-                matched_tracks = sorted(scored_tracks, 
-                                     key=lambda x: x['match_count'], 
-                                     reverse=True)[:12]
-                
-                logger.info(f"selected {len(matched_tracks)} tracks with highest match count")
-                
-                # format track info
-                playlist = []
-                for track in matched_tracks:
-                    try:
-                        track_uri = track.get('track_uri', '')
-                        track_id = track_uri.split(':')[-1] if track_uri else ''
-                        
-                        # get track info
-                        track_info = None
-                        if track_id:
-                            track_info = spotify_client.get_track_info(track_id)
-                        
-                        album_image_url = (track_info.get('album_image_url') 
-                                        if track_info and track_info.get('album_image_url') 
-                                        else '/default-album.png')
-                        preview_url = track_info.get('preview_url') if track_info else None
-                        
-                        playlist.append({
-                            'id': track_uri,
-                            'name': track.get('track_name', ''),
-                            'artist': track.get('artist_name', ''),
-                            'albumName': track.get('album_name', ''),
-                            'duration': track.get('duration_ms', 0),
-                            'pos': len(playlist),
-                            'albumImageUrl': album_image_url,
-                            'spotifyUrl': f"https://open.spotify.com/track/{track_id}" if track_id else None,
-                            'previewUrl': preview_url,
-                            'matchCount': track['match_count'],
-                            'matchedTags': track['matched_tags']
-                        })
-                        
-
-                        logger.info(f"added track to playlist: {track.get('track_name')} (matched tags: {track['matched_tags']})")
-                        
-                    except Exception as e:
-                        logger.error(f"error processing single track: {str(e)}")
-                        continue
-            logger.info(f"Final selected {len(playlist)} recommended songs")
-        except Exception as e:
-            logger.error(f"Music recommendation failed: {str(e)}")
-            logger.error(f"Error details: {e.__class__.__name__}: {str(e)}")
-            logger.error(f"Current working directory: {os.getcwd()}")
-            playlist = []
+        all_scenes = []
+        for result in results:
+            for scene in result.get('scenes', []):
+                scene['source'] = 'image'
+                all_scenes.append(scene)
 
         response_data = {
             'success': True,
-            'scenes': scenes,
-            'styles': [],  # No longer return style list
-            'playlist': playlist
+            'results': results
         }
-        logger.info(f"Returning response: {response_data}")
+
+        # Shared playlist over the scenes of all images
+        if request.form.get('playlist', '').lower() in ('1', 'true', 'yes'):
+            catalog = track_catalog.snapshot()
+            if catalog is None:
+                return catalog_unavailable()
+            response_data['playlist'] = recommend_playlist(catalog, all_scenes) if all_scenes else []
+
+        logger.info(f"analyze_batch processed {len(results)} images")
         return jsonify(response_data)
-        
+
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        logger.error(f"Error processing batch request: {str(e)}", exc_info=True)
         return jsonify({
             'error': f'Server error: {str(e)}',
             'success': False
@@ -811,12 +1144,46 @@ def analyze():
 # Add health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up and serving, whether or not the model has loaded"""
     logger.info("Health check request")
+    loaded = model_loader.wait(0)
+    scene_predictor = loaded[1] if loaded else None
     return jsonify({
         "status": "healthy",
-        "model_loaded": hasattr(app, 'model')
+        "model_loaded": loaded is not None,
+        "spotify_cache": track_metadata_cache.stats(),
+        "preview_verifier": spotify_client.preview_verifier.stats(),
+        "inference_batching": (scene_predictor.stats()
+                               if isinstance(scene_predictor, InferenceBatcher) else None),
+        "scene_cache": scene_cache.stats(),
+        "memory": {"pid": os.getpid(), "preload": MODEL_PRELOAD, **(memory_usage() or {})}
+    })
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once the model can serve image requests, 503 while loading or after a failure"""
+    loaded = model_loader.wait(0)
+    data = {
+        "ready": loaded is not None,
+        "model_state": model_loader.state,
+        "model_load_seconds": model_loader.load_seconds
+    }
+    if loaded is None:
+        data["error"] = model_loader.error
+        response = jsonify(data)
+        response.status_code = 503
+        if model_loader.state != ModelLoader.FAILED:
+            response.headers['Retry-After'] = str(MODEL_RETRY_AFTER)
+        return response
+
+    model, _ = loaded
+    data.update({
+        "backbone": model.backbone,
+        "torch_threads": {"intra_op": model.num_threads, "inter_op": model.interop_threads},
+        "quantization": model.quantization,
+        "model_startup": {"source": model.model_source, **model.startup_timings}
     })
+    return jsonify(data)
 
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=8080, debug=True) 
\ No newline at end of file
+    app.run(host='127.0.0.1', port=8080) 
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""ASGI entry point: /analyze runs on an event loop, all other routes on the Flask app
+
+/analyze awaits Spotify enrichment with an async HTTP client and runs image
+decode and inference in a thread pool, so one process serves many concurrent
+requests without a thread parked on each network wait. Every other route
+(/analyze_batch, /health, /ready, ...) is the unchanged Flask view, run in
+the event loop's default executor.
+
+    hypercorn asgi_app:app --bind 0.0.0.0:8080
+    python asgi_app.py          # same, on $PORT
+
+Configuration is the Flask app's environment, plus ASYNC_INFERENCE_WORKERS.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, jsonify, request
+
+import app as flask_service
+from async_spotify_client import AsyncSpotifyClient
+from log_config import sample_request
+from spotify_client import MAX_IDS_PER_REQUEST
+from stage_timing import server_timing_header, start_request, timed_stage
+
+logger = logging.getLogger(__name__)
+
+quart_app = Quart(__name__)
+quart_app.config['MAX_CONTENT_LENGTH'] = flask_service.MAX_FILE_SIZE + 1024 * 1024
+# Follow the Flask app, whose debug mode comes from FLASK_DEBUG
+quart_app.debug = flask_service.app.debug
+
+# Paths served natively by the Quart app; everything else goes to Flask
+ASYNC_ROUTES = frozenset(['/analyze'])
+
+# Threads for decode + inference; with batching every waiting caller holds one, so match the batch size
+INFERENCE_BATCHING = os.getenv('INFERENCE_BATCHING', '0') == '1'
+ASYNC_INFERENCE_WORKERS = int(os.getenv(
+    'ASYNC_INFERENCE_WORKERS',
+    os.getenv('INFERENCE_MAX_BATCH_SIZE', '8') if INFERENCE_BATCHING else '2'
+))
+inference_executor = ThreadPoolExecutor(max_workers=ASYNC_INFERENCE_WORKERS,
+                                        thread_name_prefix='inference')
+
+async_spotify_client = AsyncSpotifyClient(
+    flask_service.spotify_client,
+    pool_size=int(os.getenv('SPOTIFY_POOL_SIZE', '10'))
+)
+
+
+@quart_app.before_serving
+async def open_spotify_client():
+    await async_spotify_client.start()
+
+
+@quart_app.after_serving
+async def close_spotify_client():
+    await async_spotify_client.close()
+    inference_executor.shutdown(wait=False)
+
+
+async def enrich_tracks(track_ids, timeout=flask_service.ENRICHMENT_DEADLINE):
+    """Fetch Spotify info for all 50-id chunks concurrently, returning only what finished before the deadline"""
+    track_ids = list(dict.fromkeys(track_ids))
+    tasks = {
+        asyncio.ensure_future(async_spotify_client.get_tracks_info(chunk)): chunk
+        for chunk in (track_ids[i:i + MAX_IDS_PER_REQUEST]
+                      for i in range(0, len(track_ids), MAX_IDS_PER_REQUEST))
+    }
+    if not tasks:
+        return {}
+
+    done, not_done = await asyncio.wait(tasks, timeout=timeout)
+    for task in not_done:
+        task.cancel()
+    if not_done:
+        missed = sum(len(tasks[task]) for task in not_done)
+        logger.warning(f"spotify enrichment missed the {timeout}s deadline for {missed} tracks")
+
+    track_infos = {}
+    for task in done:
+        try:
+            track_infos.update(task.result())
+        except Exception as e:
+            logger.error(f"spotify enrichment failed for {len(tasks[task])} tracks: {str(e)}")
+    return track_infos
+
+
+async def recommend_playlist(catalog, scenes):
+    """Async counterpart of app.recommend_playlist; returns [] on failure"""
+    try:
+        matched_tracks = flask_service.match_scenes(catalog, scenes)
+        with timed_stage('enrichment'):
+            track_infos = await enrich_tracks(flask_service.spotify_track_ids(matched_tracks))
+        return flask_service.build_playlist(matched_tracks, track_infos)
+    except Exception as e:
+        logger.error(f"Music recommendation failed: {str(e)}", exc_info=True)
+        return []
+
+
+async def wait_for_model():
+    """The loaded (model, scene_predictor), waiting off the event loop; None if not ready in time"""
+    loaded = flask_service.model_loader.wait(0)
+    if loaded is None:
+        loaded = await asyncio.get_running_loop().run_in_executor(
+            None, flask_service.model_loader.wait, flask_service.MODEL_WAIT_TIMEOUT)
+    return loaded
+
+
+@quart_app.before_request
+async def before_request():
+    """Pick whether this request's INFO logs are kept (LOG_SAMPLE_RATE) and start stage timings"""
+    sample_request(flask_service.LOG_SAMPLE_RATE)
+    if flask_service.SERVER_TIMING:
+        start_request()
+
+
+@quart_app.after_request
+async def after_request(response):
+    """Handle CORS response headers"""
+    origin = request.headers.get('Origin')
+    if origin:
+        response.headers.update(flask_service.cors_headers(origin))
+
+    server_timing = server_timing_header() if flask_service.SERVER_TIMING else None
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
+
+@quart_app.route('/analyze', methods=['POST'])
+async def analyze():
+    """Same request handling as app.analyze, through the shared app.py helpers"""
+    logger.info("received analyze request")
+    try:
+        form = await request.form
+        image_file, params, error = flask_service.parse_analyze_request(
+            await request.files, form, await request.values)
+        if error is not None:
+            return error
+
+        scenes = []
+        if image_file is not None:
+            loaded = await wait_for_model()
+            if loaded is None:
+                logger.warning(f"model not ready ({flask_service.model_loader.state}), rejecting image request")
+                return flask_service.model_unavailable()
+            _, scene_predictor = loaded
+
+            # run in a copy of this request's context so stage timings are recorded
+            scenes, error = await asyncio.get_running_loop().run_in_executor(
+                inference_executor, contextvars.copy_context().run, flask_service.image_scenes,
+                image_file, scene_predictor, *params)
+            if error is not None:
+                return error
+
+        scenes, error = flask_service.add_text_scene(scenes, form)
+        if error is not None:
+            return error
+
+        catalog = flask_service.track_catalog.snapshot()
+        if catalog is None:
+            return flask_service.catalog_unavailable()
+        playlist = await recommend_playlist(catalog, scenes)
+        return flask_service.analyze_response(scenes, playlist)
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Server error: {str(e)}',
+            'success': False
+        }), 500
+
+
+# Flask views are blocking; the middleware runs each one in the loop's default executor
+flask_asgi = AsyncioWSGIMiddleware(
+    flask_service.app,
+    max_body_size=flask_service.MAX_REQUEST_SIZE
+)
+
+
+async def app(scope, receive, send):
+    """Route /analyze to Quart and other HTTP paths to Flask; Quart also handles lifespan events"""
+    if scope['type'] == 'http' and scope['path'] not in ASYNC_ROUTES:
+        await flask_asgi(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.getenv('PORT', '8080')}"]
+    asyncio.run(serve(app, config))
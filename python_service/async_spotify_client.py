@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+import httpx
+
+from spotify_client import (DONE, FAIL, MAX_IDS_PER_REQUEST, MAX_RETRIES, REFRESH_TOKEN, request_failed,
+                            response_action)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSpotifyClient:
+    """Non-blocking batch track lookups for the ASGI server
+
+    Shares the token, metadata cache, track parsing and preview verifier of a
+    SpotifyClient, but sends API requests through an httpx.AsyncClient so a
+    request waiting on Spotify does not hold a thread. Token refreshes are
+    rare and go through the SpotifyClient in a worker thread.
+    """
+
+    def __init__(self, client, pool_size=10):
+        self.client = client
+        self.pool_size = pool_size
+        self._http = None
+
+    async def start(self):
+        """Open the connection pool; call from the event loop that will use it"""
+        self._http = httpx.AsyncClient(
+            timeout=self.client.timeout,
+            limits=httpx.Limits(max_connections=self.pool_size,
+                                max_keepalive_connections=self.pool_size)
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _token(self, expired_token=None):
+        token = self.client.cached_token(expired_token)
+        if token:
+            return token
+        return await asyncio.to_thread(self.client.token, expired_token)
+
+    async def _get(self, path, params=None):
+        """GET an API path under the same retry policy as SpotifyClient._get
+
+        Returns the decoded JSON body, or None when the request ultimately fails.
+        """
+        for attempt in range(MAX_RETRIES):
+            access_token = await self._token()
+            if not access_token:
+                logger.error("无法获取 Spotify 访问令牌")
+                return None
+
+            try:
+                response = await self._http.get(
+                    f"{self.client.api_base_url}{path}",
+                    params=params,
+                    headers={
+                        'Authorization': f'Bearer {access_token}'
+                    }
+                )
+            except httpx.HTTPError as e:
+                action, value = request_failed(e, attempt)
+            else:
+                action, value = response_action(response, attempt)
+
+            if action == DONE:
+                return value
+            if action == FAIL:
+                return None
+            if action == REFRESH_TOKEN:
+                await self._token(expired_token=access_token)
+            elif attempt + 1 < MAX_RETRIES:
+                await asyncio.sleep(value)
+
+        logger.error(f"请求 Spotify API 失败，已达到最大重试次数: {path}")
+        return None
+
+    async def _fetch_chunk(self, chunk):
+        data = await self._get('/tracks', params={'ids': ','.join(chunk)})
+        if data is None:
+            return None
+        return self.client.parse_tracks(chunk, data)
+
+    async def get_tracks_info(self, track_ids):
+        """批量获取歌曲信息, all 50-id chunks in flight at once
+
+        Same result as SpotifyClient.get_tracks_info: {track_id: info or None}.
+        """
+        client = self.client
+        track_infos, track_ids = client.cached_tracks_info(track_ids)
+
+        chunks = [track_ids[start:start + MAX_IDS_PER_REQUEST]
+                  for start in range(0, len(track_ids), MAX_IDS_PER_REQUEST)]
+        fetched = {}
+        for chunk, parsed in zip(chunks, await asyncio.gather(*map(self._fetch_chunk, chunks))):
+            if parsed is None:
+                # Request failed; report the tracks as unresolved but don't cache that
+                track_infos.update(dict.fromkeys(chunk))
+            else:
+                fetched.update(parsed)
+
+        if client.cache is not None and fetched:
+            client.cache.set_many(fetched)
+        track_infos.update((track_id, client.check_preview(info)) for track_id, info in fetched.items())
+
+        if track_ids:
+            logger.info(f"批量获取歌曲信息: 请求 {len(track_ids)} 首, "
+                        f"成功 {sum(1 for info in fetched.values() if info)} 首")
+        return track_infos
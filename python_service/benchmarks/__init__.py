@@ -0,0 +1,121 @@
+"""Benchmark and comparison scripts for the Python service
+
+Run them from python_service/ so the model files resolve, e.g.
+`python -m benchmarks.preprocess_parity path/to/images`.
+"""
+import multiprocessing
+import os
+import statistics
+import time
+
+import torch
+from PIL import Image
+
+from places365_model import IMAGE_EXTENSIONS, Places365Model
+from process_memory import memory_usage
+
+
+def list_images(image_dir, limit=None):
+    """Sorted image paths under image_dir"""
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(image_dir)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def parse_list(value):
+    """Comma-separated integers from the command line, e.g. '1,4,8' -> [1, 4, 8]"""
+    return [int(item) for item in value.split(',') if item]
+
+
+def evaluate_model(build_model, paths, batch_size, results):
+    """Load a model with build_model() and put its predictions, timings and RSS on results
+
+    Runs in the child process started by run_isolated, so the RSS is the
+    model's real footprint. A model that fails to load puts {'error': ...}.
+    """
+    try:
+        model = build_model()
+    except Exception as e:
+        results.put({'error': str(e)})
+        return
+
+    tensors = [model.preprocess(Places365Model.decode(Image.open(path))) for path in paths]
+
+    predictions = []
+    latencies = []
+    for tensor in tensors:
+        start = time.perf_counter()
+        top5 = model.predict_tensors(tensor.unsqueeze(0))[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        predictions.append([p['scene'] for p in top5])
+
+    start = time.perf_counter()
+    for i in range(0, len(tensors), batch_size):
+        model.predict_tensors(torch.stack(tensors[i:i + batch_size]))
+    throughput = len(tensors) / (time.perf_counter() - start)
+
+    results.put({
+        'predictions': predictions,
+        'latencies': latencies,
+        'throughput': throughput,
+        'startup_ms': model.startup_timings['total_ms'],
+        'rss_mb': (memory_usage() or {}).get('rss_mb', 0.0)
+    })
+
+
+def run_isolated(build_model, paths, batch_size=8):
+    """evaluate_model in a fresh spawned process; build_model must be picklable"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=evaluate_model, args=(build_model, paths, batch_size, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def compare_models(builders, paths, batch_size=8, extra_columns=()):
+    """Evaluate each (name, build_model) pair in isolation and print them against the first
+
+    Reports top-1 agreement / top-5 overlap with the first model that loads,
+    single-image latency, batched throughput, RSS and startup time.
+    extra_columns are (header, fn(result, reference) -> str) pairs appended
+    to each row. Returns the results of the models that loaded.
+    """
+    variants = []
+    for name, build_model in builders:
+        result = run_isolated(build_model, paths, batch_size)
+        if 'error' in result:
+            print(f"{name}: failed to load: {result['error']}")
+            continue
+        result['name'] = name
+        variants.append(result)
+    if not variants:
+        return variants
+
+    n = len(paths)
+    reference = variants[0]
+    print(f"images: {n}, reference: {reference['name']}")
+    print(f"{'model':>12} {'top-1':>7} {'top-5':>7} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} "
+          f"{'img/s':>8} {'RSS MB':>8} {'start ms':>9}" + ''.join(f" {header:>9}" for header, _ in extra_columns))
+    for variant in variants:
+        top1 = sum(a[0] == b[0] for a, b in zip(reference['predictions'], variant['predictions'])) / n
+        top5 = sum(len(set(a) & set(b)) for a, b in zip(reference['predictions'], variant['predictions'])) / (5 * n)
+        print(f"{variant['name']:>12} {top1:>7.1%} {top5:>7.1%} {percentile(variant['latencies'], 50):8.2f} "
+              f"{percentile(variant['latencies'], 99):8.2f} {statistics.mean(variant['latencies']):8.2f} "
+              f"{variant['throughput']:8.1f} {variant['rss_mb']:8.1f} {variant['startup_ms']:9.0f}"
+              + ''.join(f" {fn(variant, reference):>9}" for _, fn in extra_columns))
+    return variants
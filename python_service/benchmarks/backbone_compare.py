@@ -0,0 +1,49 @@
+"""Compare the Places365 backbones on a local image set
+
+Each backbone is loaded in its own process, so the reported memory is that
+backbone's real footprint. Reports startup time, single-image latency,
+batched throughput, RSS after the run, and top-1 agreement / top-5 overlap
+with the reference backbone (the first one listed).
+
+    python -m benchmarks.backbone_compare path/to/images \
+        [--backbones resnet18,alexnet] [--batch-size 8] [--limit 200]
+
+By default every backbone whose checkpoint or artifact is present locally is compared.
+"""
+import argparse
+import functools
+import os
+
+from benchmarks import compare_models, list_images
+from places365_model import BACKBONES, Places365Model, default_artifact_path
+
+
+def local_backbones():
+    return [name for name, backbone in BACKBONES.items()
+            if os.path.exists(backbone.weights_path) or os.path.exists(default_artifact_path(name))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image_dir')
+    parser.add_argument('--backbones', help='comma-separated, reference first (default: all available locally)')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = list_images(args.image_dir, args.limit)
+    if not paths:
+        parser.error(f'no images found in {args.image_dir}')
+    backbones = [name for name in (args.backbones or '').split(',') if name] or local_backbones()
+    if not backbones:
+        parser.error('no backbone checkpoints found; pass --backbones to download them')
+
+    builders = [
+        (name, functools.partial(Places365Model, backbone=name, artifact_path=default_artifact_path(name)))
+        for name in backbones
+    ]
+    compare_models(builders, paths, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
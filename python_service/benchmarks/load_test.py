@@ -0,0 +1,168 @@
+"""Drive /analyze on a running server at increasing concurrency
+
+Each level runs `concurrency` clients that send requests back to back for
+--duration seconds (a closed loop, like users waiting on the page). Reports
+throughput, error count and p50/p95/p99 latency per level, and with --pid
+the server's memory after each level: total PSS of the master and workers,
+and the largest single RSS. Use it to check worker/thread settings in
+gunicorn.conf.py:
+
+    cd python_service && gunicorn app:app &
+    python -m benchmarks.load_test http://127.0.0.1:8080 --images path/to/images \
+        [--concurrency 1,4,8,16] [--duration 20] [--pid <gunicorn master pid>]
+
+--images takes one file or a directory; clients cycle through the images
+(start the server with SCENE_CACHE_SIZE=0 so repeats still run the model).
+Without it the requests are
+text-only (catalog scoring plus Spotify enrichment). When the server runs
+with SERVER_TIMING=1, the mean time per stage (decode, preprocess,
+inference, scoring, enrichment) is printed for each level as well.
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks import list_images, parse_list, percentile
+from process_memory import child_pids, memory_usage
+
+STAGES = ('decode', 'preprocess', 'inference', 'scoring', 'enrichment')
+
+
+def load_images(path):
+    """[(filename, bytes)] for an image file or every image in a directory"""
+    paths = [path] if os.path.isfile(path) else list_images(path)
+    images = []
+    for image_path in paths:
+        with open(image_path, 'rb') as f:
+            images.append((os.path.basename(image_path), f.read()))
+    return images
+
+
+def server_memory(pid):
+    """(total PSS, largest RSS) in MB of a server process and its children, or None"""
+    usages = [memory_usage(p) for p in [pid] + child_pids(pid)]
+    usages = [usage for usage in usages if usage]
+    if not usages:
+        return None
+    return sum(usage['pss_mb'] for usage in usages), max(usage['rss_mb'] for usage in usages)
+
+
+def parse_server_timing(header):
+    """{stage: ms} from a Server-Timing header such as 'decode;dur=4.1, inference;dur=38.0'"""
+    timings = {}
+    for metric in filter(None, (part.strip() for part in (header or '').split(','))):
+        name, _, params = metric.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                timings[name.strip()] = float(value)
+    return timings
+
+
+def send(session, url, image, text):
+    """POST one /analyze request; returns (ok, stage timings)"""
+    files = {'image': image} if image else None
+    try:
+        response = session.post(url, data={'text': text} if text else None, files=files, timeout=60)
+        return response.status_code == 200, parse_server_timing(response.headers.get('Server-Timing'))
+    except requests.RequestException:
+        return False, {}
+
+
+class Level:
+    """Results of one concurrency level, shared by its client threads"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.stages = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, ok, elapsed_ms, timings):
+        with self.lock:
+            if not ok:
+                self.errors += 1
+                return
+            self.latencies.append(elapsed_ms)
+            for stage, ms in timings.items():
+                self.stages[stage].append(ms)
+
+
+def client(url, images, text, deadline, level):
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        image = next(images) if images else None
+        start = time.perf_counter()
+        ok, timings = send(session, url, image, text)
+        level.record(ok, (time.perf_counter() - start) * 1000.0, timings)
+
+
+def run_level(url, concurrency, duration, images, text):
+    level = Level()
+    deadline = time.perf_counter() + duration
+    clients = [threading.Thread(target=client, args=(url, images, text, deadline, level))
+               for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return level, time.perf_counter() - start
+
+
+def run_load(url, levels, duration, images=None, text=None, pid=None):
+    """Run every concurrency level against url, print the tables, and return [(concurrency, Level)]"""
+    # Shared by all clients; next() on the C iterator is atomic under the GIL
+    image_cycle = itertools.cycle(images) if images else None
+
+    # One request first so lazy loading isn't counted against the first level
+    send(requests.Session(), url, images[0] if images else None, text)
+
+    results = []
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'PSS MB':>8} {'max RSS':>8}")
+    for concurrency in levels:
+        level, elapsed = run_level(url, concurrency, duration, image_cycle, text)
+        memory = server_memory(pid) if pid else None
+        pss, rss = memory if memory else (float('nan'), float('nan'))
+        print(f"{concurrency:>8} {len(level.latencies):>9} {level.errors:>7} "
+              f"{len(level.latencies) / elapsed:8.1f} {percentile(level.latencies, 50):8.1f} "
+              f"{percentile(level.latencies, 95):8.1f} {percentile(level.latencies, 99):8.1f} "
+              f"{pss:8.1f} {rss:8.1f}")
+        results.append((concurrency, level))
+
+    stages = [stage for stage in STAGES if any(level.stages.get(stage) for _, level in results)]
+    if stages:
+        print("mean ms per stage (over the requests that ran it)")
+        print(f"{'clients':>8} " + ' '.join(f'{stage:>11}' for stage in stages))
+        for concurrency, level in results:
+            means = [sum(level.stages[stage]) / len(level.stages[stage]) if level.stages[stage] else 0.0
+                     for stage in stages]
+            print(f"{concurrency:>8} " + ' '.join(f'{ms:11.1f}' for ms in means))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('server', help='base URL, e.g. http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per level')
+    parser.add_argument('--images', help='image file or directory to upload')
+    parser.add_argument('--text', default=None, help="text scene (default 'beach sunset' without --images)")
+    parser.add_argument('--pid', type=int, help='server (gunicorn master) pid, to report memory')
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else None
+    if args.images and not images:
+        parser.error(f'no images found in {args.images}')
+    text = args.text if args.text is not None else (None if images else 'beach sunset')
+    run_load(args.server.rstrip('/') + '/analyze', args.concurrency, args.duration, images, text, args.pid)
+
+
+if __name__ == '__main__':
+    main()
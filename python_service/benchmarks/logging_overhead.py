@@ -0,0 +1,90 @@
+"""Measure /analyze latency under different logging configurations
+
+Each mode runs the same requests through the Flask test client with logs
+written to a temporary file, so formatting and I/O are both counted.
+Spotify enrichment is stubbed out to keep network time out of the numbers.
+
+  verbose     DEBUG, text, every request logged, gc.collect() per request
+  default     INFO, text, every request logged
+  production  INFO, JSON, 10% of requests sampled
+
+    python -m benchmarks.logging_overhead [--requests 300] [--image photo.jpg]
+
+'verbose' reuses the old logging level and per-request gc.collect() but runs
+today's handlers, which log less than the old ones did. It is a lower bound
+on the old overhead, not a measurement of the old code; check out the old
+revision and run its server under benchmarks.load_test for that.
+"""
+import argparse
+import gc
+import io
+import statistics
+import tempfile
+import time
+
+from benchmarks import percentile
+
+MODES = {
+    'verbose': {'level': 'DEBUG', 'fmt': 'text', 'sample_rate': 1.0, 'gc_collect': True},
+    'default': {'level': 'INFO', 'fmt': 'text', 'sample_rate': 1.0, 'gc_collect': False},
+    'production': {'level': 'INFO', 'fmt': 'json', 'sample_rate': 0.1, 'gc_collect': False},
+}
+
+
+def run_mode(app_module, mode, payloads, log_file):
+    settings = MODES[mode]
+    app_module.configure_logging(level=settings['level'], fmt=settings['fmt'],
+                                 sample_rate=settings['sample_rate'], stream=log_file)
+    app_module.LOG_SAMPLE_RATE = settings['sample_rate']
+
+    client = app_module.app.test_client()
+    latencies = []
+    for payload in payloads:
+        start = time.perf_counter()
+        response = client.post('/analyze', data=payload(), content_type='multipart/form-data')
+        if settings['gc_collect']:
+            gc.collect()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        if response.status_code != 200:
+            raise RuntimeError(f"/analyze returned {response.status_code}: {response.get_data(as_text=True)}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--text', default='beach ocean sunset night city')
+    parser.add_argument('--image', help='also send this image with every request')
+    args = parser.parse_args()
+
+    import app as app_module
+
+    # Keep Spotify out of the measurement
+    app_module.spotify_client.get_tracks_info = lambda track_ids: {}
+
+    image_bytes = None
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+
+    def payload():
+        data = {'text': args.text}
+        if image_bytes is not None:
+            data['image'] = (io.BytesIO(image_bytes), 'benchmark.jpg')
+        return data
+
+    print(f"{'mode':>10}  {'mean':>8}  {'p50':>8}  {'p95':>8}  {'p99':>8}  log bytes")
+    for mode in MODES:
+        with tempfile.TemporaryFile('w+') as log_file:
+            run_mode(app_module, mode, [payload] * 10, log_file)  # warm up
+            log_file.seek(0)
+            log_file.truncate()
+            latencies = run_mode(app_module, mode, [payload] * args.requests, log_file)
+            log_file.flush()
+            log_bytes = log_file.tell()
+        print(f"{mode:>10}  {statistics.mean(latencies):6.2f}ms  {percentile(latencies, 50):6.2f}ms  "
+              f"{percentile(latencies, 95):6.2f}ms  {percentile(latencies, 99):6.2f}ms  {log_bytes}")
+
+
+if __name__ == '__main__':
+    main()
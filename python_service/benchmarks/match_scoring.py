@@ -0,0 +1,88 @@
+"""Time CatalogSnapshot.match on a synthetic catalog and check it against the old scorer
+
+Builds --tracks tracks with --tags-per-track tags drawn (Zipf-like) from a
+--vocabulary-size vocabulary, then runs random queries of --query-tags
+probability-weighted tags. Reports p50/p99 latency of the sparse scorer and
+of the previous dict-of-postings scorer, and checks that both rank the same
+tracks for unweighted (text-style) queries.
+
+    python -m benchmarks.match_scoring [--tracks 100000] [--queries 500]
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from benchmarks import percentile
+from track_catalog import CatalogSnapshot, TagVocabulary, Track
+
+
+def synthetic_tracks(n_tracks, vocabulary_size, tags_per_track, rng):
+    tags = [f'tag{i}' for i in range(vocabulary_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary_size)]
+    return tuple(
+        Track(uri=f'spotify:track:{i}', name=f'track {i}', artist='', album='', duration_ms=0,
+              tags=tuple(rng.choices(tags, weights, k=tags_per_track)))
+        for i in range(n_tracks)
+    )
+
+
+def legacy_match(snapshot, postings, tag_weights, limit):
+    """The previous scorer: walk each query tag's posting list into a dict, then heap-select"""
+    import heapq
+    scores = defaultdict(float)
+    for tag_id, weight in tag_weights.items():
+        for track_idx in postings.get(tag_id, ()):
+            scores[track_idx] += weight
+    return [track_idx for track_idx, _ in
+            heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=100000)
+    parser.add_argument('--vocabulary-size', type=int, default=2000)
+    parser.add_argument('--tags-per-track', type=int, default=6)
+    parser.add_argument('--query-tags', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tracks = synthetic_tracks(args.tracks, args.vocabulary_size, args.tags_per_track, rng)
+    start = time.perf_counter()
+    snapshot = CatalogSnapshot(tracks, 0.0, TagVocabulary())
+    print(f"built {len(tracks)} tracks, {len(snapshot.tag_tracks)} nonzeros in "
+          f"{(time.perf_counter() - start) * 1000:.0f}ms")
+
+    postings = defaultdict(list)
+    for track_idx, track in enumerate(tracks):
+        for tag in track.tags:
+            postings[snapshot.vocabulary.get(tag)].append(track_idx)
+
+    tag_ids = list(range(len(snapshot.vocabulary)))
+    queries = [{tag_id: rng.random() for tag_id in rng.sample(tag_ids, args.query_tags)}
+               for _ in range(args.queries)]
+
+    sparse_ms, legacy_ms = [], []
+    for tag_weights in queries:
+        start = time.perf_counter()
+        snapshot.match(tag_weights)
+        sparse_ms.append((time.perf_counter() - start) * 1000.0)
+        start = time.perf_counter()
+        legacy_match(snapshot, postings, tag_weights, 12)
+        legacy_ms.append((time.perf_counter() - start) * 1000.0)
+
+    mismatches = 0
+    for tag_weights in queries[:50]:
+        unweighted = dict.fromkeys(tag_weights, 1.0)
+        sparse = [int(track.uri.split(':')[-1]) for track, _, _, _ in snapshot.match(unweighted)]
+        mismatches += sparse != legacy_match(snapshot, postings, unweighted, 12)
+
+    for name, ms in (('sparse', sparse_ms), ('legacy', legacy_ms)):
+        print(f"{name:>7}: p50 {percentile(ms, 50):7.3f} ms  p99 {percentile(ms, 99):7.3f} ms")
+    print(f"unweighted ranking mismatches: {mismatches}/50")
+
+
+if __name__ == '__main__':
+    main()
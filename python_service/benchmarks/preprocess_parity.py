@@ -0,0 +1,103 @@
+"""Compare the legacy and fused image preprocessing paths
+
+Legacy: full decode -> RGB -> LANCZOS resize to 800px -> Resize(256) ->
+CenterCrop(224) -> ToTensor -> Normalize.
+Fused:  Places365Model.decode (JPEG draft or integer reduce, RGB) ->
+        Places365Model.preprocess (one resize).
+
+Reports per-image CPU time, decoded pixel counts, tensor differences and
+top-1 / top-5 agreement of the model outputs.
+
+    python -m benchmarks.preprocess_parity path/to/images [--limit 200]
+"""
+import argparse
+import statistics
+import time
+
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+
+from benchmarks import list_images, percentile
+from places365_model import MEAN, STD, Places365Model
+
+LEGACY_MAX_SIZE = (800, 800)
+
+legacy_transform = transforms.Compose([
+    transforms.Resize(256),
+    transforms.CenterCrop(224),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=MEAN, std=STD)
+])
+
+
+def legacy_decode(path):
+    image = Image.open(path)
+    image = image.convert('RGB')
+    decoded_pixels = image.size[0] * image.size[1]
+    if image.size[0] > LEGACY_MAX_SIZE[0] or image.size[1] > LEGACY_MAX_SIZE[1]:
+        ratio = min(LEGACY_MAX_SIZE[0] / image.size[0], LEGACY_MAX_SIZE[1] / image.size[1])
+        image = image.resize((int(image.size[0] * ratio), int(image.size[1] * ratio)),
+                             Image.Resampling.LANCZOS)
+    return legacy_transform(image), decoded_pixels
+
+
+def fused_decode(model, path):
+    # The decode app.process_image uses
+    image = Places365Model.decode(Image.open(path))
+    return model.preprocess(image), image.size[0] * image.size[1]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image_dir')
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = list_images(args.image_dir, args.limit)
+    if not paths:
+        parser.error(f'no images found in {args.image_dir}')
+
+    model = Places365Model()
+
+    legacy_ms, fused_ms = [], []
+    legacy_pixels, fused_pixels = [], []
+    tensor_diffs = []
+    top1_agree = top5_overlap = 0
+
+    for path in paths:
+        (legacy_tensor, pixels), elapsed = timed(legacy_decode, path)
+        legacy_ms.append(elapsed)
+        legacy_pixels.append(pixels)
+
+        (fused_tensor, pixels), elapsed = timed(fused_decode, model, path)
+        fused_ms.append(elapsed)
+        fused_pixels.append(pixels)
+
+        tensor_diffs.append((legacy_tensor - fused_tensor).abs().mean().item())
+
+        legacy_top, fused_top = model.predict_tensors(torch.stack([legacy_tensor, fused_tensor]))
+        legacy_scenes = [p['scene'] for p in legacy_top]
+        fused_scenes = [p['scene'] for p in fused_top]
+        top1_agree += legacy_scenes[0] == fused_scenes[0]
+        top5_overlap += len(set(legacy_scenes) & set(fused_scenes))
+
+    n = len(paths)
+    print(f"images: {n}")
+    for name, ms, pixels in (('legacy', legacy_ms, legacy_pixels), ('fused', fused_ms, fused_pixels)):
+        print(f"{name:>7}: mean {statistics.mean(ms):7.2f} ms  p50 {percentile(ms, 50):7.2f} ms  "
+              f"p99 {percentile(ms, 99):7.2f} ms  mean decoded {statistics.mean(pixels) / 1e6:.2f} MP")
+    print(f"speedup: {statistics.mean(legacy_ms) / statistics.mean(fused_ms):.2f}x")
+    print(f"mean |legacy - fused| per tensor element: {statistics.mean(tensor_diffs):.4f}")
+    print(f"top-1 agreement: {top1_agree / n:.1%}")
+    print(f"top-5 overlap:   {top5_overlap / (5 * n):.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare int8 quantized Places365 models against fp32 on a local image set
+
+Each variant is loaded in its own process, so the reported RSS is that
+variant's real footprint. The shared harness (benchmarks.compare_models)
+reports top-1 agreement and top-5 overlap with the fp32 predictions,
+latency, throughput and RSS; this script adds the RSS delta and p50
+speedup over fp32.
+
+    python -m benchmarks.quantization_accuracy path/to/images \
+        [--modes dynamic,static] [--calibration-dir path/to/calibration] [--limit 200]
+
+Use calibration images that are disjoint from the evaluation set.
+
+'dynamic' only quantizes nn.Linear layers, which in these backbones is the
+final classifier; the convolutions that dominate size and latency stay fp32.
+Its RSS and latency deltas are therefore close to zero by construction and
+say nothing about int8 convolutions -- compare against 'static' for that.
+"""
+import argparse
+import functools
+
+from benchmarks import compare_models, list_images, percentile
+from places365_model import Places365Model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image_dir')
+    parser.add_argument('--modes', default='dynamic,static')
+    parser.add_argument('--calibration-dir', help='images used to calibrate static quantization')
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = list_images(args.image_dir, args.limit)
+    if not paths:
+        parser.error(f'no images found in {args.image_dir}')
+    modes = [mode for mode in args.modes.split(',') if mode]
+    if 'static' in modes and not args.calibration_dir:
+        parser.error('static quantization needs --calibration-dir')
+
+    builders = [('fp32', Places365Model)] + [
+        (mode, functools.partial(Places365Model, quantization=mode, calibration_dir=args.calibration_dir))
+        for mode in modes
+    ]
+    if 'dynamic' in modes:
+        print("dynamic: only the final Linear layer is int8, convolutions stay fp32 (see the module docstring)")
+    compare_models(builders, paths, extra_columns=[
+        ('dRSS MB', lambda variant, fp32: f"{variant['rss_mb'] - fp32['rss_mb']:+.1f}"),
+        ('speedup', lambda variant, fp32: f"{percentile(fp32['latencies'], 50) / percentile(variant['latencies'], 50):.2f}x"),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""End-to-end latency benchmark of the service against local fixtures
+
+Generates a synthetic catalog and image set (seeded, so runs are
+comparable), starts the Spotify stub and a server on them, then drives
+/analyze with text-only and image requests at each concurrency level. The
+server runs with SERVER_TIMING=1 and the scene cache off, so every request
+reports its decode / preprocess / inference / scoring / enrichment time.
+
+    python -m benchmarks.run_suite [--server gunicorn|asgi] [--tracks 20000] \
+        [--images 24] [--spotify-latency-ms 150] [--concurrency 1,4,8] [--duration 15] \
+        [--max-p95-ms 2000]
+
+With --max-p95-ms the exit status is 1 when any level's p95 exceeds the
+budget or any request fails, so the suite can gate a deploy.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks import parse_list, percentile
+from benchmarks.load_test import load_images, run_load
+from benchmarks.spotify_stub import start_stub
+from benchmarks.synthetic_catalog import write_catalog
+from benchmarks.synthetic_images import write_images
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_COMMANDS = {
+    'gunicorn': lambda port: ['gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}'],
+    'asgi': lambda port: ['hypercorn', 'asgi_app:app', '--bind', f'127.0.0.1:{port}'],
+}
+
+
+def write_fixtures(workdir, n_tracks, n_images, seed):
+    """Catalog and images under workdir; returns (tracks path, image dir)"""
+    tracks_path = os.path.join(workdir, 'tracks.json')
+    write_catalog(tracks_path, n_tracks, missing_rate=0.02, seed=seed)
+    image_dir = os.path.join(workdir, 'images')
+    write_images(image_dir, n_images, seed)
+    return tracks_path, image_dir
+
+
+def start_server(kind, port, env, log):
+    """Start the server and wait until /ready answers 200; returns the process"""
+    process = subprocess.Popen(SERVER_COMMANDS[kind](port), cwd=SERVICE_DIR, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} exited with status {process.returncode}, see {log.name}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/ready', timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'{kind} was not ready after 180s, see {log.name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='gunicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tracks', type=int, default=20000)
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--spotify-latency-ms', type=float, default=150.0)
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per level')
+    parser.add_argument('--max-p95-ms', type=float, help='fail when a level exceeds this p95')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='scenesound-bench-')
+    print(f"fixtures in {workdir}")
+    tracks_path, image_dir = write_fixtures(workdir, args.tracks, args.images, args.seed)
+    images = load_images(image_dir)
+
+    stub = start_stub(latency_ms=args.spotify_latency_ms)
+    stub_url = f'http://127.0.0.1:{stub.server_address[1]}'
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        TRACKS_FILE=tracks_path,
+        SPOTIFY_CLIENT_ID='bench',
+        SPOTIFY_CLIENT_SECRET='bench',
+        SPOTIFY_TOKEN_URL=f'{stub_url}/api/token',
+        SPOTIFY_API_BASE_URL=f'{stub_url}/v1',
+        # every lookup goes to the stub, every image through the model
+        SPOTIFY_CACHE_TTL='0',
+        SCENE_CACHE_SIZE='0',
+        SERVER_TIMING='1',
+        # worker recycling drops pooled keep-alive connections, which would show up as client errors
+        GUNICORN_MAX_REQUESTS='0',
+        LOG_LEVEL='WARNING'
+    )
+
+    with open(os.path.join(workdir, 'server.log'), 'w') as log:
+        server = start_server(args.server, args.port, env, log)
+        try:
+            url = f'http://127.0.0.1:{args.port}/analyze'
+            print(f"\n{args.server}, {args.tracks} tracks, Spotify stub {args.spotify_latency_ms:.0f} ms")
+            print("\ntext requests")
+            results = run_load(url, args.concurrency, args.duration, text='beach sunset night', pid=server.pid)
+            print(f"\nimage requests ({len(images)} images)")
+            results += run_load(url, args.concurrency, args.duration, images=images, pid=server.pid)
+        finally:
+            server.terminate()
+            server.wait(30)
+            stub.shutdown()
+
+    if args.max_p95_ms is not None:
+        failed = [(concurrency, level) for concurrency, level in results
+                  if level.errors or percentile(level.latencies, 95) > args.max_p95_ms]
+        for concurrency, level in failed:
+            print(f"FAIL at {concurrency} clients: p95 {percentile(level.latencies, 95):.1f} ms, "
+                  f"{level.errors} errors (budget {args.max_p95_ms:.0f} ms)")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Local stand-in for the Spotify Web API with configurable latency
+
+Serves the endpoints the service uses: the client-credentials token
+(POST /api/token), GET /v1/tracks?ids= and /v1/tracks/<id>, and HEAD on the
+preview URLs it hands out. Track ids starting with 'missing' come back as
+null. Point the service at it with
+
+    python -m benchmarks.spotify_stub --port 9200 --latency-ms 150 &
+    SPOTIFY_CLIENT_ID=x SPOTIFY_CLIENT_SECRET=x \
+    SPOTIFY_TOKEN_URL=http://127.0.0.1:9200/api/token \
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:9200/v1 gunicorn app:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class SpotifyStubHandler(BaseHTTPRequestHandler):
+    """Reads latency, jitter and request counts from its server (see start_stub)"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        server = self.server
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+    def _count(self, endpoint):
+        with self.server.lock:
+            self.server.counts[endpoint] = self.server.counts.get(endpoint, 0) + 1
+
+    def _json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _track(self, track_id):
+        if track_id.startswith('missing'):
+            return None
+        host, port = self.server.server_address[:2]
+        return {
+            'id': track_id,
+            'album': {'images': [
+                {'url': f'https://i.scdn.co/image/{track_id}-640', 'width': 640, 'height': 640},
+                {'url': f'https://i.scdn.co/image/{track_id}-64', 'width': 64, 'height': 64}
+            ]},
+            'preview_url': f'http://{host}:{port}/preview/{track_id}'
+        }
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._count('token')
+        self._json({'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600})
+
+    def do_HEAD(self):
+        self._count('preview')
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/v1/tracks':
+            self._count('tracks')
+            self._delay()
+            ids = parse_qs(url.query).get('ids', [''])[0].split(',')
+            self._json({'tracks': [self._track(track_id) for track_id in ids if track_id]})
+        elif url.path.startswith('/v1/tracks/'):
+            self._count('track')
+            self._delay()
+            track = self._track(url.path.rsplit('/', 1)[1])
+            self._json(track if track else {'error': {'status': 404}}, 200 if track else 404)
+        elif url.path == '/stats':
+            with self.server.lock:
+                self._json(dict(self.server.counts))
+        else:
+            self._json({'error': {'status': 404}}, 404)
+
+
+def start_stub(port=0, latency_ms=100.0, jitter_ms=0.0):
+    """Start the stub in a daemon thread; returns the server (server.server_address has the port)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), SpotifyStubHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000.0
+    server.jitter = jitter_ms / 1000.0
+    server.counts = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='spotify-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='added to every track lookup')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform +/- jitter on the latency')
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.latency_ms, args.jitter_ms)
+    print(f"Spotify stub on http://127.0.0.1:{server.server_address[1]} "
+          f"({args.latency_ms:.0f} +/- {args.jitter_ms:.0f} ms per lookup)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
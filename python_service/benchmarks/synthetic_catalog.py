@@ -0,0 +1,86 @@
+"""Write a synthetic tracks.json of a given size for load tests
+
+Tags are drawn with Zipf-like weights from the words of the Places365 labels
+plus common genre/mood tags, so image and text queries hit realistic
+posting-list lengths. A fraction of tracks repeat across playlists (the
+loader keeps the first copy) and, with --missing-rate, some track ids are
+ones the Spotify stub reports as unknown.
+
+    python -m benchmarks.synthetic_catalog --tracks 50000 --output /tmp/tracks.json
+    TRACKS_FILE=/tmp/tracks.json gunicorn app:app
+"""
+import argparse
+import itertools
+import json
+import random
+
+from places365_model import load_places365_labels
+from scene_tags import LABEL_QUALIFIERS
+
+GENRE_TAGS = [
+    'pop', 'rock', 'indie', 'electronic', 'jazz', 'classical', 'hip hop', 'folk', 'ambient', 'acoustic',
+    'chill', 'calm', 'happy', 'sad', 'energetic', 'romantic', 'dreamy', 'upbeat', 'relaxing', 'party',
+    'summer', 'night', 'morning', 'road trip', 'workout', 'study', 'lofi', 'soul', 'r&b', 'country'
+]
+
+
+def tag_vocabulary():
+    """Genre/mood tags first (the most frequent), then the distinct Places365 label words"""
+    words = dict.fromkeys(GENRE_TAGS)
+    for label in load_places365_labels():
+        for word in label.split('_'):
+            if word and word not in LABEL_QUALIFIERS:
+                words.setdefault(word)
+    return list(words)
+
+
+def synthetic_playlists(n_tracks, tags_per_track, playlist_size, duplicate_rate, missing_rate, rng):
+    vocabulary = tag_vocabulary()
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    tracks = []
+    for i in range(n_tracks):
+        track_id = f'missing{i:015d}' if rng.random() < missing_rate else f'{i:022d}'
+        tracks.append({
+            'track_uri': f'spotify:track:{track_id}',
+            'track_name': f'Track {i}',
+            'artist_name': f'Artist {i % 997}',
+            'album_name': f'Album {i % 4999}',
+            'duration_ms': rng.randint(90000, 360000),
+            'tags': sorted(set(rng.choices(vocabulary, cum_weights=cum_weights, k=tags_per_track)))
+        })
+
+    # Re-list some tracks in other playlists, as real exports do
+    entries = tracks + [rng.choice(tracks) for _ in range(int(n_tracks * duplicate_rate))]
+    rng.shuffle(entries)
+    return [{'name': f'playlist {i // playlist_size}', 'tracks': entries[i:i + playlist_size]}
+            for i in range(0, len(entries), playlist_size)]
+
+
+def write_catalog(path, n_tracks, tags_per_track=6, playlist_size=100, duplicate_rate=0.1,
+                  missing_rate=0.0, seed=0):
+    """Write a tracks.json with n_tracks unique tracks; returns the number of playlists"""
+    playlists = synthetic_playlists(n_tracks, tags_per_track, playlist_size, duplicate_rate,
+                                    missing_rate, random.Random(seed))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'playlists': playlists}, f)
+    return len(playlists)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--tracks', type=int, default=10000, help='unique tracks')
+    parser.add_argument('--tags-per-track', type=int, default=6)
+    parser.add_argument('--playlist-size', type=int, default=100)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n_playlists = write_catalog(args.output, args.tracks, args.tags_per_track, args.playlist_size,
+                                args.duplicate_rate, args.missing_rate, args.seed)
+    print(f"wrote {args.tracks} tracks in {n_playlists} playlists to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Write a reproducible set of test images in the sizes and formats clients upload
+
+Images cycle through phone-camera, desktop and thumbnail sizes, mostly JPEG
+with some PNG and WebP, and contain gradients and shapes so they compress
+(and decode) like photos rather than flat colour. Every image is distinct,
+so a run over them measures the full path instead of the scene cache.
+
+    python -m benchmarks.synthetic_images --count 24 --output /tmp/bench_images
+"""
+import argparse
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFilter
+
+# (width, height, format): 12MP phone photo, 1080p, 4:3 laptop upload, thumbnail
+VARIANTS = [
+    (4032, 3024, 'JPEG'),
+    (1920, 1080, 'JPEG'),
+    (1280, 960, 'JPEG'),
+    (640, 480, 'JPEG'),
+    (1280, 960, 'PNG'),
+    (1920, 1080, 'WEBP'),
+]
+
+# Side of the square noise patch tiled over each image
+NOISE_TILE = 256
+
+
+def synthetic_image(width, height, rng):
+    """A vertical two-colour gradient with random blurred shapes and some sensor-like noise"""
+    top = tuple(rng.randrange(256) for _ in range(3))
+    bottom = tuple(rng.randrange(256) for _ in range(3))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.composite(Image.new('RGB', (width, height), bottom),
+                            Image.new('RGB', (width, height), top), gradient)
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(8, 24)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1 = min(width, x0 + rng.randint(width // 20, width // 3))
+        y1 = min(height, y0 + rng.randint(height // 20, height // 3))
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=fill)
+    image = image.filter(ImageFilter.GaussianBlur(radius=max(1, width // 400)))
+    # Tile a seeded noise patch; Image.effect_noise can't be seeded
+    tile = Image.frombytes('RGB', (NOISE_TILE, NOISE_TILE), rng.randbytes(NOISE_TILE * NOISE_TILE * 3))
+    noise = Image.new('RGB', (width, height))
+    for x in range(0, width, NOISE_TILE):
+        for y in range(0, height, NOISE_TILE):
+            noise.paste(tile, (x, y))
+    return Image.blend(image, noise, 0.06)
+
+
+def write_images(output, count, seed=0):
+    """Write `count` images to the output directory; returns their total size in bytes"""
+    os.makedirs(output, exist_ok=True)
+    rng = random.Random(seed)
+    total = 0
+    for i in range(count):
+        width, height, fmt = VARIANTS[i % len(VARIANTS)]
+        path = os.path.join(output, f'{i:03d}_{width}x{height}.{fmt.lower().replace("jpeg", "jpg")}')
+        synthetic_image(width, height, rng).save(path, fmt, **({'quality': 85} if fmt != 'PNG' else {}))
+        total += os.path.getsize(path)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='directory to write the images to')
+    parser.add_argument('--count', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    total = write_images(args.output, args.count, args.seed)
+    print(f"wrote {args.count} images ({total / 1024 / 1024:.1f} MB) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Sweep torch threads x worker processes x batch size for the Places365 model
+
+Every combination starts `workers` processes (like gunicorn workers), each
+with its own model using `threads` intra-op threads, and has them run
+forward passes of `batch` images back to back for --duration seconds.
+Reports per-call p50/p99 latency and aggregate images/s, and flags
+combinations that oversubscribe the available CPUs.
+
+    python -m benchmarks.thread_sweep --threads 1,2,4 --workers 1,2 --batch-sizes 1,4,8
+"""
+import argparse
+import itertools
+import multiprocessing
+import time
+
+from benchmarks import parse_list, percentile
+
+
+def worker(threads, batch_size, duration, barrier, results):
+    import torch
+    from places365_model import Places365Model
+
+    model = Places365Model(num_threads=threads, interop_threads=1)
+    input_batch = torch.randn(batch_size, 3, Places365Model.INPUT_SIZE, Places365Model.INPUT_SIZE)
+    for _ in range(3):
+        model.predict_tensors(input_batch)  # warm up
+
+    barrier.wait()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        model.predict_tensors(input_batch)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    results.put(latencies)
+
+
+def run(threads, workers, batch_size, duration):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(threads, batch_size, duration, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=parse_list, default=[1, 2, 4])
+    parser.add_argument('--workers', type=parse_list, default=[1, 2])
+    parser.add_argument('--batch-sizes', type=parse_list, default=[1, 4, 8])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per combination')
+    args = parser.parse_args()
+
+    from places365_model import available_cpus
+    cpus = available_cpus()
+    print(f"available CPUs: {cpus}")
+    print(f"{'threads':>7} {'workers':>7} {'batch':>5}  {'p50 ms':>8} {'p99 ms':>8} {'img/s':>8}")
+
+    for threads, workers, batch_size in itertools.product(args.threads, args.workers, args.batch_sizes):
+        latencies = run(threads, workers, batch_size, args.duration)
+        throughput = len(latencies) * batch_size / args.duration
+        note = '  oversubscribed' if threads * workers > cpus else ''
+        print(f"{threads:>7} {workers:>7} {batch_size:>5}  {percentile(latencies, 50):8.1f} "
+              f"{percentile(latencies, 99):8.1f} {throughput:8.1f}{note}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
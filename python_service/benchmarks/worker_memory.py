@@ -0,0 +1,42 @@
+"""Per-worker memory of a running gunicorn server
+
+Reads /proc/<pid>/smaps_rollup for the master and each worker. USS is what a
+worker costs on its own; PSS sums to the real footprint of the whole server.
+Run it against a server started with and without preloading to compare:
+
+    MODEL_PRELOAD=1 gunicorn --preload -w 4 app:app &
+    python -m benchmarks.worker_memory <master pid> [--budget-mb 1024]
+"""
+import argparse
+
+from process_memory import child_pids, memory_usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pid', type=int, help='gunicorn master pid')
+    parser.add_argument('--budget-mb', type=float, default=1024.0, help='memory limit of the instance')
+    args = parser.parse_args()
+
+    master = memory_usage(args.pid)
+    if master is None:
+        parser.error(f'cannot read /proc/{args.pid}/smaps_rollup')
+    workers = [(pid, memory_usage(pid)) for pid in child_pids(args.pid)]
+    workers = [(pid, usage) for pid, usage in workers if usage is not None]
+
+    print(f"{'process':>14} {'rss MB':>8} {'pss MB':>8} {'uss MB':>8} {'shared MB':>10}")
+    for name, usage in [(f'master {args.pid}', master)] + [(f'worker {pid}', usage) for pid, usage in workers]:
+        print(f"{name:>14} {usage['rss_mb']:8.1f} {usage['pss_mb']:8.1f} "
+              f"{usage['uss_mb']:8.1f} {usage['shared_mb']:10.1f}")
+
+    total_pss = master['pss_mb'] + sum(usage['pss_mb'] for _, usage in workers)
+    print(f"total (sum of PSS): {total_pss:.1f} MB")
+    if workers:
+        worker_uss = sum(usage['uss_mb'] for _, usage in workers) / len(workers)
+        extra = int((args.budget_mb - total_pss) // worker_uss) if worker_uss else 0
+        print(f"mean worker USS: {worker_uss:.1f} MB")
+        print(f"estimated workers within {args.budget_mb:.0f} MB: {max(0, len(workers) + extra)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Build the frozen TorchScript model that app.py loads at startup
+
+Loading the checkpoint, stripping 'module.' prefixes and re-tracing on every
+process start is slow; this does it once (e.g. during the Docker build) and
+writes a frozen (torch.jit.freeze) TorchScript artifact instead.
+
+    python build_model_artifact.py [--backbone resnet18] [--output places365_resnet18.torchscript.pt]
+                                   [--quantization dynamic|static --calibration-dir images/]
+"""
+import argparse
+import logging
+import os
+import time
+
+import torch
+
+from places365_model import (BACKBONES, DEFAULT_BACKBONE, QUANTIZATION_MODES, Places365Model,
+                             default_artifact_path)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=os.getenv('MODEL_BACKBONE', DEFAULT_BACKBONE))
+    parser.add_argument('--output', default=os.getenv('MODEL_ARTIFACT'),
+                        help='defaults to places365_<backbone>.torchscript.pt')
+    parser.add_argument('--quantization', choices=QUANTIZATION_MODES,
+                        default=os.getenv('MODEL_QUANTIZATION') or None)
+    parser.add_argument('--calibration-dir', default=os.getenv('QUANTIZATION_CALIBRATION_DIR'))
+    args = parser.parse_args()
+    args.output = args.output or default_artifact_path(args.backbone)
+
+    # Build from the checkpoint, never from an existing artifact
+    model = Places365Model(quantization=args.quantization, calibration_dir=args.calibration_dir,
+                           backbone=args.backbone)
+    model.export_artifact(args.output)
+
+    # Check the artifact loads and predicts like the freshly traced model
+    start = time.perf_counter()
+    reloaded = Places365Model(quantization=args.quantization, artifact_path=args.output,
+                              backbone=args.backbone)
+    load_ms = (time.perf_counter() - start) * 1000.0
+    if reloaded.model_source != 'artifact':
+        raise SystemExit(f"artifact {args.output} could not be loaded back")
+
+    example = torch.randn(2, 3, Places365Model.INPUT_SIZE, Places365Model.INPUT_SIZE)
+    with torch.no_grad():
+        max_diff = (model.model(example) - reloaded.model(example)).abs().max().item()
+    logger.info(f"artifact: {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB), "
+                f"startup {load_ms:.0f}ms vs {model.startup_timings['total_ms']:.0f}ms from checkpoint, "
+                f"max logit difference {max_diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""gunicorn settings for the Flask service
+
+gunicorn picks this file up from the working directory:
+
+    cd python_service && gunicorn app:app
+
+Workers and threads are sized from the CPUs and memory the container may
+use (cgroup limits first, then the host). Inference is CPU-bound, so there
+is at most one worker per CPU and the torch thread pools split the CPUs
+between workers; threads inside a worker overlap the Spotify I/O. The model
+is preloaded in the master and shared copy-on-write, which is what makes a
+worker cheap enough to recycle with max_requests.
+
+Every derived value can be overridden: WEB_CONCURRENCY, GUNICORN_THREADS,
+GUNICORN_TIMEOUT, GUNICORN_KEEPALIVE, GUNICORN_MAX_REQUESTS,
+GUNICORN_MAX_REQUESTS_JITTER, MODEL_PRELOAD, and the memory estimates
+GUNICORN_MASTER_MB / GUNICORN_WORKER_MB. Validate changes with
+benchmarks/load_test.py.
+"""
+import logging
+import os
+
+logger = logging.getLogger('gunicorn.error')
+
+# Fraction of the memory limit the server may plan to use; the rest is headroom for request spikes
+MEMORY_FRACTION = 0.8
+
+
+def cpu_limit():
+    """CPUs available to the server: cgroup v2 cpu.max quota, else the affinity mask"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def memory_limit_mb():
+    """Memory available to the server in MB: cgroup v2/v1 limit, else total RAM"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            # v1 reports "no limit" as a huge number
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value) / (1024 * 1024)
+        except (OSError, ValueError):
+            continue
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1]) / 1024
+    return 1024.0
+
+
+preload = os.getenv('MODEL_PRELOAD', '1') == '1'
+os.environ['MODEL_PRELOAD'] = '1' if preload else '0'
+
+# Master holds the model, labels and catalog; a preloaded worker only adds its private pages
+# (benchmarks/worker_memory.py measures both)
+master_mb = float(os.getenv('GUNICORN_MASTER_MB', '600'))
+worker_mb = float(os.getenv('GUNICORN_WORKER_MB', '150' if preload else '500'))
+
+cpus = cpu_limit()
+memory_mb = memory_limit_mb()
+workers_by_memory = int((memory_mb * MEMORY_FRACTION - master_mb) // worker_mb)
+
+workers = int(os.getenv('WEB_CONCURRENCY', '0')) or max(1, min(cpus, workers_by_memory))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# places365_model.default_num_threads() splits the CPUs between this many workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+preload_app = preload
+# A worker that takes this long for one request is restarted
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+# Behind the platform's load balancer connections are reused; keep idle ones a little while
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers to bound slow memory growth; the jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', str(max(1, max_requests // 10))))
+# Worker heartbeat files on tmpfs; a disk-backed /tmp can stall the heartbeat in containers
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def on_starting(server):
+    server.log.info(f"{cpus} CPUs, {memory_mb:.0f} MB memory: {workers} workers x {threads} threads "
+                    f"({worker_class}), preload={preload}, up to {workers_by_memory} workers by memory")
+
+
+def post_worker_init(worker):
+    """Warm the model and the scorer after fork so the worker's first request isn't slow"""
+    import app as service
+    service.warm_up()
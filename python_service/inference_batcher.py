@@ -0,0 +1,112 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import torch
+
+from places365_model import DEFAULT_TOP_K
+from stage_timing import timed_stage
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """Dynamic micro-batching in front of Places365Model
+
+    Callers preprocess their image in their own thread and enqueue the tensor.
+    A single worker thread collects up to `max_batch_size` tensors, waiting at
+    most `max_wait_ms` after the first one arrives, runs one batched forward
+    pass and hands each caller its own top-k result. If the forward pass
+    fails, every caller in that batch gets the exception.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._batch_sizes = Counter()
+        self._start_worker()
+        if hasattr(os, 'register_at_fork'):
+            # Built before a gunicorn --preload fork: each worker needs its own thread and queue
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._worker.start()
+
+    def _after_fork(self):
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._start_worker()
+
+    def predict(self, image, k=DEFAULT_TOP_K, min_probability=0.0, timeout=None):
+        """Same contract as Places365Model.predict, but shares the forward pass with concurrent callers"""
+        if image is None:
+            logger.warning("收到空图像")
+            return []
+
+        future = Future()
+        with timed_stage('preprocess'):
+            input_tensor = self.model.preprocess(image)
+        # Includes the wait for the batch to fill
+        with timed_stage('inference'):
+            self._queue.put((input_tensor, future, k, min_probability))
+            return future.result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            futures = [future for _, future, _, _ in batch]
+            try:
+                # One pass with the largest k asked for; each caller gets its own k / threshold
+                input_batch = torch.stack([tensor for tensor, _, _, _ in batch])
+                results = self.model.predict_tensors(input_batch, max(k for _, _, k, _ in batch))
+            except Exception as e:
+                logger.error(f"批量预测过程中出错 ({len(futures)} 个请求): {str(e)}", exc_info=True)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, k, min_probability), predictions in zip(batch, results):
+                future.set_result([prediction for prediction in predictions[:k]
+                                   if prediction['probability'] >= min_probability])
+
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(futures)
+                self._batch_sizes[len(futures)] += 1
+
+    def stats(self):
+        """Achieved batch sizes, for tuning max_batch_size / max_wait_ms"""
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'images': self._images,
+                'avg_batch_size': round(self._images / self._batches, 2) if self._batches else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'queue_depth': self._queue.qsize()
+            }
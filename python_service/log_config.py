@@ -0,0 +1,51 @@
+import contextvars
+import json
+import logging
+import random
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Whether INFO-level logs of the current request are kept
+_request_sampled = contextvars.ContextVar('log_request_sampled', default=True)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RequestSampleFilter(logging.Filter):
+    """Drop INFO and below for requests that were not sampled; warnings and errors always pass"""
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+
+def sample_request(rate):
+    """Decide once per request whether its INFO logs are emitted"""
+    _request_sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def configure_logging(level='INFO', fmt='text', sample_rate=1.0, stream=None):
+    """Install a single root handler with the given level, format ('text' or 'json') and sampling"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    if sample_rate < 1.0:
+        handler.addFilter(RequestSampleFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    return handler
@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """Runs a slow model factory in a background thread
+
+    The server can bind and answer liveness checks and text-only requests
+    while weights are loaded; image requests call wait() and either get the
+    loaded value or None if it is not ready in time.
+    """
+
+    PENDING = 'pending'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.state = self.PENDING
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        """Start loading in a daemon thread (no-op if already started)"""
+        with self._start_lock:
+            if self.state != self.PENDING:
+                return
+            self.state = self.LOADING
+        threading.Thread(target=self._load, name='model-loader', daemon=True).start()
+
+    def load(self):
+        """Load synchronously in the calling thread, e.g. in a gunicorn master before forking"""
+        with self._start_lock:
+            if self.state != self.PENDING:
+                return self.wait(None)
+            self.state = self.LOADING
+        self._load()
+        return self._value
+
+    def _after_fork(self):
+        # The loader thread does not survive fork; restart an interrupted load in the child
+        self._start_lock = threading.Lock()
+        if self.state == self.LOADING:
+            logger.warning("process forked while the model was loading, reloading in the child")
+            self._ready = threading.Event()
+            self.state = self.PENDING
+            self.start()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            logger.info("Starting model initialization...")
+            self._value = self.factory()
+            self.state = self.READY
+            logger.info("Model initialization successful")
+        except Exception as e:
+            self.error = str(e)
+            self.state = self.FAILED
+            logger.error(f"Model initialization failed: {str(e)}", exc_info=True)
+        finally:
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self._ready.set()
+
+    def wait(self, timeout=0):
+        """Return the loaded value, waiting up to timeout seconds; None if not ready or failed"""
+        if self.state == self.PENDING:
+            self.start()
+        self._ready.wait(timeout)
+        return self._value if self.state == self.READY else None
+
+    @property
+    def ready(self):
+        return self.state == self.READY
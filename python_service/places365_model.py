@@ -1,21 +1,151 @@
 import torch
 import torchvision.models as models
-import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
 import re
+import json
+import time
 from typing import List, Dict, Tuple, Union
 import os
+import platform
 import requests
 from urllib.parse import urlparse
 import logging
+from collections import namedtuple
+
+from stage_timing import timed_stage
 
 logger = logging.getLogger(__name__)
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Places365 backbones: torchvision constructor, checkpoint file and download URLs
+Backbone = namedtuple('Backbone', ['build', 'weights_path', 'urls'])
+PLACES365_MODELS_URL = 'http://places2.csail.mit.edu/models_places365'
+BACKBONES = {
+    'resnet18': Backbone(models.resnet18, 'resnet18_places365.pth.tar', [
+        'https://data.csail.mit.edu/places/places365/resnet18_places365.pth.tar',
+        'https://github.com/CSAILVision/places365/releases/download/v1/resnet18_places365.pth.tar'
+    ]),
+    'resnet50': Backbone(models.resnet50, 'resnet50_places365.pth.tar',
+                         [f'{PLACES365_MODELS_URL}/resnet50_places365.pth.tar']),
+    'alexnet': Backbone(models.alexnet, 'alexnet_places365.pth.tar',
+                        [f'{PLACES365_MODELS_URL}/alexnet_places365.pth.tar']),
+    'densenet161': Backbone(models.densenet161, 'densenet161_places365.pth.tar',
+                            [f'{PLACES365_MODELS_URL}/densenet161_places365.pth.tar']),
+}
+DEFAULT_BACKBONE = 'resnet18'
+
+# Old DenseNet checkpoints name layers 'norm.1' where torchvision expects 'norm1'
+DENSENET_KEY_PATTERN = re.compile(
+    r'^(.*denselayer\d+\.(?:norm|relu|conv))\.((?:[12])\.(?:weight|bias|running_mean|running_var))$')
+
+# Scenes returned per image unless the caller asks for another k
+DEFAULT_TOP_K = 5
+
+# Supported post-training quantization modes
+QUANTIZATION_MODES = ('dynamic', 'static')
+
+# ImageNet normalization used by the Places365 CNNs
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def default_artifact_path(backbone: str = DEFAULT_BACKBONE) -> str:
+    """Where build_model_artifact.py writes the frozen TorchScript model for a backbone"""
+    return f'places365_{backbone}.torchscript.pt'
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks / cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_num_threads() -> int:
+    """Intra-op threads per process so that all gunicorn workers together use each core once"""
+    workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+    return max(1, available_cpus() // max(1, workers))
+
+
+def configure_threads(num_threads: int = None, interop_threads: int = None) -> Tuple[int, int]:
+    """Set torch's intra-op and inter-op thread pools
+
+    Explicit arguments win, then TORCH_NUM_THREADS / TORCH_INTEROP_THREADS,
+    then a worker-count-aware default. Returns the (intra, inter) counts in effect.
+    """
+    num_threads = num_threads or int(os.getenv('TORCH_NUM_THREADS', '0')) or default_num_threads()
+    interop_threads = interop_threads or int(os.getenv('TORCH_INTEROP_THREADS', '0')) or 1
+
+    torch.set_num_threads(num_threads)
+    if torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started
+            logger.warning(f"无法设置 inter-op 线程数: {str(e)}")
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def load_places365_labels(download: bool = True) -> List[str]:
+    """Load the 365 Places365 category labels (e.g. 'beach_house'), downloading the list if missing
+
+    With download=False a missing file raises FileNotFoundError instead, for
+    callers at import time that must not block on the network.
+    """
+    if not os.path.exists('categories_places365.txt'):
+        if not download:
+            raise FileNotFoundError(
+                f"categories_places365.txt not found in {os.getcwd()}; it ships with python_service")
+        urls = [
+            'https://raw.githubusercontent.com/CSAILVision/places365/master/categories_places365.txt',
+            'https://data.csail.mit.edu/places/places365/categories_places365.txt'
+        ]
+        
+        for url in urls:
+            try:
+                logger.info(f"尝试从 {url} 下载类别标签...")
+                response = requests.get(url, timeout=10)
+                if response.status_code == 200:
+                    with open('categories_places365.txt', 'wb') as f:
+                        f.write(response.content)
+                    logger.info("类别标签下载成功")
+                    break
+            except Exception as e:
+                logger.warning(f"从 {url} 下载失败: {str(e)}")
+        else:
+            raise Exception("无法下载类别标签文件")
+    
+    labels = []
+    with open('categories_places365.txt', 'r') as f:
+        for line in f:
+            label = line.strip().split(' ')[0][3:]
+            label = label.replace('/', '_')
+            labels.append(label)
+    return labels
+
+
 class Places365Model:
-    def __init__(self):
-        """Initialize Places365 model"""
-        logger.info("初始化 Places365 模型...")
+    # Equivalent of Resize(RESIZE_SIZE) + CenterCrop(INPUT_SIZE)
+    RESIZE_SIZE = 256
+    INPUT_SIZE = 224
+
+    def __init__(self, num_threads: int = None, interop_threads: int = None,
+                 quantization: str = None, calibration_dir: str = None,
+                 artifact_path: str = None, backbone: str = DEFAULT_BACKBONE):
+        """Initialize Places365 model
+
+        backbone: one of BACKBONES; all of them share this predict/predict_batch interface.
+        quantization: None for fp32, 'dynamic' (int8 Linear layers) or 'static'
+        (int8 convolutions too, calibrated on the images in calibration_dir).
+        artifact_path: frozen TorchScript file from build_model_artifact.py; when it
+        exists and matches the configuration, building and tracing are skipped.
+        """
+        if backbone not in BACKBONES:
+            raise ValueError(f"unknown backbone {backbone!r}, expected one of {', '.join(BACKBONES)}")
+        self.backbone = backbone
+        logger.info(f"初始化 Places365 模型 ({backbone})...")
         
         # Predefined scenes and confidence
         self.custom_scenes = {
@@ -27,110 +157,265 @@ class Places365Model:
         
         # Set device
         self.device = torch.device('cpu')
-        logger.info(f"使用设备: {self.device}")
+        self.num_threads, self.interop_threads = configure_threads(num_threads, interop_threads)
+        logger.info(f"使用设备: {self.device}, intra-op 线程: {self.num_threads}, "
+                    f"inter-op 线程: {self.interop_threads}")
         
         try:
-            # Initialize model
-            logger.info("加载 ResNet18 模型...")
-            self.model = models.resnet18(weights=None)
-            self.model.fc = torch.nn.Linear(self.model.fc.in_features, 365)
-            
-            # Load pretrained weights
-            weights_path = 'resnet18_places365.pth.tar'
-            if not os.path.exists(weights_path):
-                # 使用备用链接
-                urls = [
-                    'https://data.csail.mit.edu/places/places365/resnet18_places365.pth.tar',
-                    'https://github.com/CSAILVision/places365/releases/download/v1/resnet18_places365.pth.tar'
-                ]
-                
-                for url in urls:
-                    try:
-                        logger.info(f"尝试从 {url} 下载预训练模型权重...")
-                        response = requests.get(url, timeout=30)
-                        if response.status_code == 200:
-                            with open(weights_path, 'wb') as f:
-                                f.write(response.content)
-                            logger.info("模型权重下载成功")
-                            break
-                    except Exception as e:
-                        logger.warning(f"从 {url} 下载失败: {str(e)}")
-                else:
-                    raise Exception("无法下载模型权重文件")
-            
-            # Optimize weight loading process
-            logger.info("加载模型权重...")
-            checkpoint = torch.load(weights_path, map_location='cpu')
-            state_dict = {str.replace(k, 'module.', ''): v 
-                         for k, v in checkpoint['state_dict'].items()}
-            self.model.load_state_dict(state_dict)
-            del checkpoint, state_dict
-            torch.cuda.empty_cache() if torch.cuda.is_available() else None
+            start = time.perf_counter()
+            self.startup_timings = {}
             
-            self.model.eval()  # Set to evaluation mode
-            logger.info("模型权重加载完成")
-            
-            # Optimize image preprocessing
-            self.preprocess = transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-            ])
+            # Fold ToTensor's 1/255 and Normalize into one multiply-subtract
+            std = torch.tensor(STD).view(3, 1, 1)
+            self._norm_scale = 1.0 / (255.0 * std)
+            self._norm_shift = torch.tensor(MEAN).view(3, 1, 1) / std
             
             # Load Places365 category labels
             logger.info("加载场景类别标签...")
             self.places365_labels = self._load_places365_labels()
+            # Object array so a whole (N, k) index matrix resolves to labels in one step
+            self.label_array = np.array(self.places365_labels, dtype=object)
             
-            # Use TorchScript to optimize model
-            logger.info("优化模型性能...")
-            example = torch.randn(1, 3, 224, 224)
-            self.model = torch.jit.trace(self.model, example)
-            del example
+            # Prefer the prebuilt TorchScript artifact; otherwise build and trace from the checkpoint
+            self.quantization = quantization
+            self.model = self._load_artifact(artifact_path, quantization) if artifact_path else None
+            if self.model is not None:
+                self.model_source = 'artifact'
+            else:
+                self.model = self._build_model(quantization, calibration_dir)
+                self.model_source = 'checkpoint'
             torch.cuda.empty_cache() if torch.cuda.is_available() else None
             
-            logger.info("Places365 模型初始化完成")
+            self.startup_timings['total_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+            logger.info(f"Places365 模型初始化完成 (来源: {self.model_source}, "
+                        f"耗时 {self.startup_timings['total_ms']:.0f}ms)")
             
         except Exception as e:
             logger.error(f"模型初始化失败: {str(e)}", exc_info=True)
             raise
 
-    def _load_places365_labels(self) -> List[str]:
-        """Load Places365 category labels"""
-        if not os.path.exists('categories_places365.txt'):
-            urls = [
-                'https://raw.githubusercontent.com/CSAILVision/places365/master/categories_places365.txt',
-                'https://data.csail.mit.edu/places/places365/categories_places365.txt'
-            ]
-            
-            for url in urls:
+    def _timed(self, name: str, start: float):
+        self.startup_timings[name] = round((time.perf_counter() - start) * 1000.0, 1)
+
+    def _build_model(self, quantization: str = None, calibration_dir: str = None) -> torch.jit.ScriptModule:
+        """Build the backbone, load its Places365 checkpoint, optionally quantize, then trace"""
+        # Initialize model
+        logger.info(f"加载 {self.backbone} 模型...")
+        backbone = BACKBONES[self.backbone]
+        model = backbone.build(weights=None, num_classes=365)
+        
+        # Load pretrained weights
+        weights_path = backbone.weights_path
+        if not os.path.exists(weights_path):
+            # 使用备用链接
+            for url in backbone.urls:
                 try:
-                    logger.info(f"尝试从 {url} 下载类别标签...")
-                    response = requests.get(url, timeout=10)
+                    logger.info(f"尝试从 {url} 下载预训练模型权重...")
+                    response = requests.get(url, timeout=30)
                     if response.status_code == 200:
-                        with open('categories_places365.txt', 'wb') as f:
+                        with open(weights_path, 'wb') as f:
                             f.write(response.content)
-                        logger.info("类别标签下载成功")
+                        logger.info("模型权重下载成功")
                         break
                 except Exception as e:
                     logger.warning(f"从 {url} 下载失败: {str(e)}")
             else:
-                raise Exception("无法下载类别标签文件")
+                raise Exception(f"无法下载模型权重文件 {weights_path}")
+        
+        # Optimize weight loading process
+        logger.info("加载模型权重...")
+        start = time.perf_counter()
+        checkpoint = torch.load(weights_path, map_location='cpu')
+        # Places365 releases wrap the weights in {'state_dict': ...}; converted ones may not
+        state_dict = checkpoint.get('state_dict', checkpoint)
+        state_dict = {DENSENET_KEY_PATTERN.sub(r'\1\2', str.replace(k, 'module.', '')): v
+                      for k, v in state_dict.items()}
+        model.load_state_dict(state_dict)
+        del checkpoint, state_dict
+        
+        model.eval()  # Set to evaluation mode
+        self._timed('load_weights_ms', start)
+        logger.info("模型权重加载完成")
+        
+        # Optional int8 post-training quantization
+        if quantization:
+            logger.info(f"量化模型: {quantization}...")
+            start = time.perf_counter()
+            model = self._quantize(model, quantization, calibration_dir)
+            self._timed('quantize_ms', start)
         
-        labels = []
-        with open('categories_places365.txt', 'r') as f:
-            for line in f:
-                label = line.strip().split(' ')[0][3:]
-                label = label.replace('/', '_')
-                labels.append(label)
-        return labels
+        # Use TorchScript to optimize model
+        logger.info("优化模型性能...")
+        start = time.perf_counter()
+        example = torch.randn(1, 3, self.INPUT_SIZE, self.INPUT_SIZE)
+        traced = torch.jit.trace(model, example)
+        self._timed('trace_ms', start)
+        return traced
+
+    def _load_artifact(self, path: str, quantization: str = None):
+        """Load a TorchScript artifact written by export_artifact(), or None if missing/stale"""
+        if not os.path.exists(path):
+            logger.info(f"未找到预编译模型 {path}, 从权重文件构建")
+            return None
+        
+        start = time.perf_counter()
+        extra_files = {'meta.json': ''}
+        try:
+            artifact = torch.jit.load(path, map_location='cpu', _extra_files=extra_files)
+            meta = json.loads(extra_files['meta.json'] or '{}')
+        except Exception as e:
+            logger.warning(f"加载预编译模型失败, 从权重文件构建: {str(e)}")
+            return None
+        
+        if (meta.get('arch') != self.backbone or meta.get('quantization') != quantization
+                or meta.get('torch_version') != torch.__version__):
+            logger.warning(f"预编译模型与当前配置不符 ({meta}), 从权重文件构建")
+            return None
+        
+        self._timed('load_artifact_ms', start)
+        logger.info(f"已加载预编译模型 {path}")
+        return artifact
+
+    def export_artifact(self, path: str):
+        """Freeze the traced model (weights inlined as constants) and save it for fast startup
+
+        optimize_for_inference() is deliberately not applied: its MKLDNN rewrites
+        don't survive torch.jit.save and gave no measurable speedup on CPU.
+        """
+        model = torch.jit.freeze(self.model.eval())
+        
+        meta = {
+            'arch': self.backbone,
+            'num_classes': len(self.places365_labels),
+            'quantization': self.quantization,
+            'torch_version': torch.__version__
+        }
+        torch.jit.save(model, path, _extra_files={'meta.json': json.dumps(meta)})
+        logger.info(f"预编译模型已保存到 {path}")
+
+    def share_memory(self) -> int:
+        """Move the weights into shared memory before forking workers (gunicorn --preload)
+
+        Covers module parameters/buffers and the constants a frozen artifact inlines
+        into its graph, so workers map the master's pages instead of copying them.
+        Returns the number of bytes moved.
+        """
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        graph = getattr(self.model, 'graph', None)
+        if graph is not None:
+            for node in graph.findAllNodes('prim::Constant'):
+                if node.hasAttribute('value') and node.kindOf('value') == 't':
+                    tensors.append(node.t('value'))
+        tensors += [self._norm_scale, self._norm_shift]
+
+        shared = 0
+        for tensor in tensors:
+            try:
+                if not tensor.is_shared():
+                    tensor.share_memory_()
+                    shared += tensor.numel() * tensor.element_size()
+            except RuntimeError as e:
+                # e.g. quantized tensors; those pages stay copy-on-write
+                logger.warning(f"无法将张量移到共享内存: {str(e)}")
+        logger.info(f"已将 {shared / 1024 / 1024:.1f}MB 模型权重移到共享内存")
+        return shared
+
+    def _quantize(self, model: torch.nn.Module, mode: str, calibration_dir: str = None,
+                  calibration_limit: int = 64) -> torch.nn.Module:
+        """Return an int8 version of model"""
+        from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"未知的量化模式: {mode} (可选: {', '.join(QUANTIZATION_MODES)})")
+
+        if mode == 'dynamic':
+            return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        paths = []
+        if calibration_dir and os.path.isdir(calibration_dir):
+            paths = sorted(
+                os.path.join(calibration_dir, name) for name in os.listdir(calibration_dir)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )[:calibration_limit]
+        if not paths:
+            raise ValueError("静态量化需要校准图片 (QUANTIZATION_CALIBRATION_DIR)")
+
+        # fbgemm for x86 servers, qnnpack for ARM
+        backend = 'qnnpack' if platform.machine().lower() in ('arm64', 'aarch64') else 'fbgemm'
+        torch.backends.quantized.engine = backend
+        example = torch.randn(1, 3, self.INPUT_SIZE, self.INPUT_SIZE)
+        prepared = prepare_fx(model, get_default_qconfig_mapping(backend), example_inputs=(example,))
+
+        logger.info(f"使用 {len(paths)} 张图片校准量化参数 ({backend})...")
+        with torch.no_grad():
+            for path in paths:
+                prepared(self.preprocess(self.decode(Image.open(path))).unsqueeze(0))
+        return convert_fx(prepared)
+
+    def _load_places365_labels(self) -> List[str]:
+        """Load Places365 category labels"""
+        return load_places365_labels()
+
+    @classmethod
+    def decode(cls, image: Image.Image) -> Image.Image:
+        """Decode an opened image as RGB at the smallest size preprocess() doesn't upsample
+
+        JPEGs are downscaled by the decoder in the DCT domain (draft). Anything
+        still larger, e.g. PNG or WebP, is box-reduced by the largest integer
+        factor that keeps its short side >= RESIZE_SIZE, so preprocess() still
+        does the only real resize. Closes `image` when a new one replaces it.
+        """
+        image.draft('RGB', (cls.RESIZE_SIZE, cls.RESIZE_SIZE))
+        if image.mode != 'RGB':
+            rgb = image.convert('RGB')
+            image.close()
+            image = rgb
+
+        factor = min(image.size) // cls.RESIZE_SIZE
+        if factor >= 2:
+            reduced = image.reduce(factor)
+            image.close()
+            image = reduced
+        image.load()
+        return image
+
+    def preprocess(self, image: Image.Image, out: torch.Tensor = None) -> torch.Tensor:
+        """Resize, center crop and normalize an RGB image into a (3, 224, 224) tensor
+
+        The Resize(256) + CenterCrop(224) pair is done as a single PIL resize of
+        the crop box straight to 224x224. When `out` is given (e.g. a row of a
+        preallocated batch) the result is written into it instead of a new tensor.
+        """
+        width, height = image.size
+        if width <= height:
+            resized_w, resized_h = self.RESIZE_SIZE, int(self.RESIZE_SIZE * height / width)
+        else:
+            resized_w, resized_h = int(self.RESIZE_SIZE * width / height), self.RESIZE_SIZE
+
+        # Center crop in resized coordinates, mapped back onto the source image
+        left = int(round((resized_w - self.INPUT_SIZE) / 2.0))
+        top = int(round((resized_h - self.INPUT_SIZE) / 2.0))
+        scale_x = width / resized_w
+        scale_y = height / resized_h
+        box = (left * scale_x, top * scale_y,
+               (left + self.INPUT_SIZE) * scale_x, (top + self.INPUT_SIZE) * scale_y)
+        image = image.resize((self.INPUT_SIZE, self.INPUT_SIZE), Image.Resampling.BILINEAR, box=box)
+
+        pixels = torch.from_numpy(np.array(image, dtype=np.uint8)).permute(2, 0, 1)
+        if out is None:
+            out = torch.empty((3, self.INPUT_SIZE, self.INPUT_SIZE), dtype=torch.float32)
+        out.copy_(pixels)
+        out.mul_(self._norm_scale).sub_(self._norm_shift)
+        return out
 
     @torch.no_grad()
-    def predict(self, image: Image.Image) -> List[Dict[str, Union[str, float]]]:
-        """Predict scene, return top 5 most likely Places365 scenes"""
+    def predict(self, image: Image.Image, k: int = DEFAULT_TOP_K,
+                min_probability: float = 0.0) -> List[Dict[str, Union[str, float]]]:
+        """Predict scene, return the k most likely Places365 scenes with probability >= min_probability
+
+        Inference errors are logged and re-raised, so callers can tell a failure from "no scenes".
+        """
         try:
             if image is None:
                 logger.warning("收到空图像")
@@ -139,34 +424,81 @@ class Places365Model:
             logger.info(f"开始处理图像，尺寸: {image.size}")
             
             # Preprocess image
-            input_tensor = self.preprocess(image)
+            with timed_stage('preprocess'):
+                input_tensor = self.preprocess(image)
             input_batch = input_tensor.unsqueeze(0)
             
             # Perform prediction
-            logger.info("执行场景预测...")
-            output = self.model(input_batch)
-            probabilities = torch.nn.functional.softmax(output[0], dim=0)
-            
-            # Get top 5 prediction results
-            top5_prob, top5_idx = torch.topk(probabilities, 5)
-            
-            # Build prediction results
-            predictions = []
-            for prob, idx in zip(top5_prob, top5_idx):
-                scene = self.places365_labels[idx]
-                probability = float(prob)
-                predictions.append({
-                    'scene': scene,
-                    'probability': probability
-                })
-                logger.info(f"预测场景: {scene}, 置信度: {probability:.4f}")
+            with timed_stage('inference'):
+                predictions = self.predict_tensors(input_batch, k, min_probability)[0]
             
             # Clean up memory
-            del input_tensor, input_batch, output, probabilities
+            del input_tensor, input_batch
             torch.cuda.empty_cache() if torch.cuda.is_available() else None
             
             return predictions
             
         except Exception as e:
             logger.error(f"预测过程中出错: {str(e)}", exc_info=True)
-            return [] 
\ No newline at end of file
+            raise
+
+    @torch.no_grad()
+    def predict_batch(self, images: List[Image.Image], batch_size: int = 32, k: int = DEFAULT_TOP_K,
+                      min_probability: float = 0.0) -> List[List[Dict[str, Union[str, float]]]]:
+        """Predict scenes for many images, stacking them into batched forward passes
+
+        Returns one top-k list per input image, in order; missing images get [].
+        Inference errors are logged and re-raised rather than reported as empty results.
+        """
+        results = [[] for _ in images]
+        valid = [(i, image) for i, image in enumerate(images) if image is not None]
+        try:
+            logger.info(f"批量预测 {len(valid)} 张图像...")
+            for start in range(0, len(valid), batch_size):
+                chunk = valid[start:start + batch_size]
+                input_batch = self.new_batch(len(chunk))
+                for row, (_, image) in enumerate(chunk):
+                    self.preprocess(image, out=input_batch[row])
+                for (i, _), predictions in zip(chunk, self.predict_tensors(input_batch, k, min_probability)):
+                    results[i] = predictions
+                del input_batch
+            return results
+
+        except Exception as e:
+            logger.error(f"批量预测过程中出错: {str(e)}", exc_info=True)
+            raise
+
+    def new_batch(self, size: int) -> torch.Tensor:
+        """Uninitialized (size, 3, 224, 224) input batch for preprocess(image, out=batch[row])"""
+        return torch.empty((size, 3, self.INPUT_SIZE, self.INPUT_SIZE))
+
+    def warm_up(self, runs: int = 2) -> float:
+        """Run throwaway forward passes so thread pools and allocator caches exist before real traffic
+
+        Returns the time taken in ms.
+        """
+        start = time.perf_counter()
+        input_batch = torch.zeros(1, 3, self.INPUT_SIZE, self.INPUT_SIZE)
+        for _ in range(runs):
+            self.predict_tensors(input_batch)
+        return (time.perf_counter() - start) * 1000.0
+
+    @torch.no_grad()
+    def predict_tensors(self, input_batch: torch.Tensor, k: int = DEFAULT_TOP_K,
+                        min_probability: float = 0.0) -> List[List[Dict[str, Union[str, float]]]]:
+        """Run one forward pass over an already preprocessed (N, 3, 224, 224) batch
+
+        Returns the top k scenes with probability >= min_probability for each image.
+        """
+        output = self.model(input_batch)
+        k = max(1, min(k, output.shape[1]))
+        
+        # A full 365-way softmax + topk measured cheaper than normalizing only the top k
+        # logits via logsumexp, so keep it; conversion happens once for the whole batch
+        top_prob, top_idx = torch.topk(torch.nn.functional.softmax(output, dim=1), k, dim=1)
+        labels = self.label_array[top_idx.numpy()].tolist()
+        return [
+            [{'scene': scene, 'probability': prob}
+             for scene, prob in zip(label_row, prob_row) if prob >= min_probability]
+            for label_row, prob_row in zip(labels, top_prob.tolist())
+        ]
@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewVerifier:
+    """Checks Spotify preview URLs in the background and remembers the result
+
+    `is_playable()` never blocks: it answers from the last known status and
+    queues a HEAD probe for URLs that are unknown or stale. Probes for the same
+    URL are deduplicated across requests.
+    """
+
+    def __init__(self, session=None, max_workers=2, ttl=86400, max_size=50000, timeout=2):
+        self.session = session or requests.Session()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self._status = OrderedDict()  # url -> (checked_at, playable)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='preview-verify')
+
+    def is_playable(self, url):
+        """Return the last known status for url (None if never checked), scheduling a check if needed"""
+        now = time.time()
+        with self._lock:
+            entry = self._status.get(url)
+            if entry is not None:
+                self._status.move_to_end(url)
+            if (entry is None or now - entry[0] > self.ttl) and url not in self._pending:
+                self._pending.add(url)
+                self._executor.submit(self._verify, url)
+        return entry[1] if entry is not None else None
+
+    def _verify(self, url):
+        try:
+            response = self.session.head(url, timeout=self.timeout)
+            playable = response.status_code == 200
+            if not playable:
+                logger.warning(f"预览 URL 不可访问: {url}")
+        except Exception as e:
+            logger.warning(f"检查预览 URL 时出错: {str(e)}")
+            playable = False
+
+        with self._lock:
+            self._pending.discard(url)
+            self._status[url] = (time.time(), playable)
+            self._status.move_to_end(url)
+            while len(self._status) > self.max_size:
+                self._status.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'known': len(self._status),
+                'playable': sum(1 for _, playable in self._status.values() if playable),
+                'pending': len(self._pending)
+            }
@@ -0,0 +1,41 @@
+import os
+
+
+def memory_usage(pid='self'):
+    """Memory of a process in MB from /proc/<pid>/smaps_rollup, or None where unavailable
+
+    rss counts every resident page; pss splits shared pages between the processes
+    mapping them; uss (private pages only) is what the process would free on exit,
+    i.e. the real per-worker cost when the model is shared copy-on-write.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        'rss_mb': mb('Rss'),
+        'pss_mb': mb('Pss'),
+        'uss_mb': mb('Private_Clean', 'Private_Dirty'),
+        'shared_mb': mb('Shared_Clean', 'Shared_Dirty')
+    }
+
+
+def child_pids(pid):
+    """Direct children of pid (e.g. the workers of a gunicorn master)"""
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(set(children))
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class SceneCache:
+    """LRU cache of predict() results keyed by the uploaded image
+
+    Exact repeats are found by a hash of the raw upload bytes, so a hit skips
+    decoding entirely. With `perceptual=True` a 64-bit difference hash of the
+    decoded image is also stored, letting resized or re-encoded copies of the
+    same picture hit after decoding but before the forward pass. Settings that
+    change the result (top-k, probability threshold) are passed as `params` and
+    become part of both keys.
+    """
+
+    def __init__(self, max_entries=1024, perceptual=False):
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(image_bytes, params=()):
+        return ('content', hashlib.blake2b(image_bytes, digest_size=16).digest()) + tuple(params)
+
+    def perceptual_key(self, image, params=()):
+        """dHash of the decoded image, or None when perceptual mode is off"""
+        if not self.perceptual:
+            return None
+        thumbnail = image.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+        pixels = list(thumbnail.getdata())
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                bits = (bits << 1) | (left > right)
+        return ('perceptual', bits) + tuple(params)
+
+    def get(self, key):
+        """Return a fresh copy of the cached scenes for key, or None"""
+        if key is None:
+            return None
+        with self._lock:
+            scenes = self._entries.get(key)
+            if scenes is None:
+                if key[0] == 'content':
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if key[0] == 'content':
+                self.hits += 1
+            else:
+                self.perceptual_hits += 1
+        # Callers add fields such as 'source', so never hand out the stored dicts
+        return [{'scene': scene, 'probability': probability} for scene, probability in scenes]
+
+    def put(self, scenes, *keys):
+        scenes = tuple((scene['scene'], scene['probability']) for scene in scenes)
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._entries[key] = scenes
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'perceptual': self.perceptual,
+                'hits': self.hits,
+                'perceptual_hits': self.perceptual_hits,
+                'misses': self.misses
+            }
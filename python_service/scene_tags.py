@@ -0,0 +1,78 @@
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Weight of a tag taken from the label itself, from STYLE_MAPPINGS, and from the 'general' fallback
+LABEL_TAG_WEIGHT = 1.0
+STYLE_TAG_WEIGHT = 0.5
+FALLBACK_TAG_WEIGHT = 0.25
+
+# Places365 qualifiers such as 'bus_station_indoor' that say nothing about the music
+LABEL_QUALIFIERS = frozenset(['indoor', 'outdoor', 'interior', 'exterior', 'inside', 'outside'])
+
+
+class SceneTagMap:
+    """Precomputed Places365 class -> weighted tag ids table
+
+    Built once at startup for all 365 labels. A label contributes its own
+    words ('boat_deck' -> 'boat', 'deck', 'boat deck', 'boat_deck') and the music
+    styles STYLE_MAPPINGS lists for the label or any of its words; labels with
+    no style mapping fall back to the 'general' styles. Tags are resolved to ids
+    of the catalog's TagVocabulary so requests only do integer lookups.
+    """
+
+    def __init__(self, labels, style_mappings, vocabulary):
+        self.labels = labels
+        self._class_ids = {label: class_id for class_id, label in enumerate(labels)}
+        self._tag_ids = []
+        self._weights = []
+        for label in labels:
+            tag_weights = {}
+            for tag, weight in label_tags(label, style_mappings):
+                tag_id = vocabulary.add(tag)
+                tag_weights[tag_id] = max(weight, tag_weights.get(tag_id, 0.0))
+            self._tag_ids.append(array('I', tag_weights))
+            self._weights.append(array('f', tag_weights.values()))
+        logger.info(f"built scene tag table for {len(labels)} labels, "
+                    f"{sum(len(ids) for ids in self._tag_ids)} weighted tags")
+
+    def __contains__(self, label):
+        return label in self._class_ids
+
+    def tags(self, label):
+        """(tag ids, weights) arrays for a Places365 label; empty for unknown labels"""
+        class_id = self._class_ids.get(label)
+        if class_id is None:
+            return array('I'), array('f')
+        return self._tag_ids[class_id], self._weights[class_id]
+
+    def tag_weights(self, scenes):
+        """Query vector {tag id: weight} for (label, probability) pairs
+
+        Table weights are scaled by each scene's probability and summed over scenes.
+        """
+        combined = {}
+        for label, probability in scenes:
+            tag_ids, weights = self.tags(label)
+            for tag_id, weight in zip(tag_ids, weights):
+                combined[tag_id] = combined.get(tag_id, 0.0) + weight * probability
+        return combined
+
+
+def label_tags(label, style_mappings):
+    """(tag, weight) pairs for one Places365 label such as 'beach_house' or 'bus_station_indoor'"""
+    words = [word for word in label.lower().split('_') if word and word not in LABEL_QUALIFIERS]
+    tags = [(label.lower(), LABEL_TAG_WEIGHT)]
+    if len(words) > 1:
+        tags.append((' '.join(words), LABEL_TAG_WEIGHT))
+    tags.extend((word, LABEL_TAG_WEIGHT) for word in words)
+
+    styled = False
+    for key in [label.lower()] + words:
+        for style in style_mappings.get(key, ()):
+            tags.append((style, STYLE_TAG_WEIGHT))
+            styled = True
+    if not styled:
+        tags.extend((style, FALLBACK_TAG_WEIGHT) for style in style_mappings.get('general', ()))
+    return tags
@@ -0,0 +1,274 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SPOTIFY_TOKEN_URL = 'https://accounts.spotify.com/api/token'
+SPOTIFY_API_BASE_URL = 'https://api.spotify.com/v1'
+
+# GET /v1/tracks accepts at most 50 ids per call
+MAX_IDS_PER_REQUEST = 50
+
+# Refresh the access token this many seconds before Spotify says it expires
+TOKEN_REFRESH_MARGIN = 60
+
+# Attempts per API request, and the wait between them unless Spotify sends Retry-After
+MAX_RETRIES = 3
+RETRY_DELAY = 1
+MAX_RETRY_DELAY = 30
+
+# What to do after one API attempt, see response_action and request_failed
+DONE, REFRESH_TOKEN, RETRY, FAIL = 'done', 'refresh_token', 'retry', 'fail'
+
+
+def response_action(response, attempt):
+    """Retry policy for one API response (requests or httpx), shared by both clients
+
+    Returns (DONE, body), (REFRESH_TOKEN, None) after a 401, (RETRY, delay)
+    after a 429 or 5xx, or (FAIL, None). Other 4xx responses are not retried
+    since sending the same request again cannot succeed.
+    """
+    status = response.status_code
+    if status == 401:
+        logger.info("访问令牌过期，重新获取")
+        return REFRESH_TOKEN, None
+    if status == 429 or status >= 500:
+        logger.error(f"请求 Spotify API 失败 (尝试 {attempt + 1}/{MAX_RETRIES}): HTTP {status}")
+        try:
+            delay = float(response.headers.get('Retry-After', RETRY_DELAY))
+        except ValueError:
+            delay = RETRY_DELAY
+        return RETRY, min(max(delay, 0), MAX_RETRY_DELAY)
+    if status >= 400:
+        logger.error(f"请求 Spotify API 失败: HTTP {status} {response.url}")
+        return FAIL, None
+    try:
+        return DONE, response.json()
+    except ValueError as e:
+        logger.error(f"获取歌曲信息时发生错误: {str(e)}")
+        return FAIL, None
+
+
+def request_failed(error, attempt):
+    """Retry policy for a network error (no response at all): retry after RETRY_DELAY"""
+    logger.error(f"请求 Spotify API 失败 (尝试 {attempt + 1}/{MAX_RETRIES}): {str(error)}")
+    return RETRY, RETRY_DELAY
+
+
+# Spotify API 客户端
+class SpotifyClient:
+    def __init__(self, client_id=None, client_secret=None,
+                 api_base_url=SPOTIFY_API_BASE_URL, token_url=SPOTIFY_TOKEN_URL, cache=None,
+                 pool_size=10, timeout=10, preview_verifier=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        # Overridable so the client can be pointed at a local stub server
+        self.api_base_url = api_base_url.rstrip('/')
+        self.token_url = token_url
+        # Optional TrackMetadataCache shared by single and batch lookups
+        self.cache = cache
+        self.timeout = timeout
+        self._access_token = None
+        self._token_expiry = 0
+        self._token_lock = threading.Lock()
+
+        # Keep-alive connection pool shared by all worker threads
+        self.session = requests.Session()
+        # One pool per host: accounts.spotify.com, api.spotify.com and the preview CDN
+        adapter = HTTPAdapter(pool_connections=3, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Optional PreviewVerifier; preview URLs are checked off the request path
+        self.preview_verifier = preview_verifier
+
+    def _get_access_token(self):
+        """获取 Spotify API 访问令牌, returns (token, expires_in)"""
+        try:
+            response = self.session.post(
+                self.token_url,
+                data={
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                },
+                headers={
+                    'Content-Type': 'application/x-www-form-urlencoded'
+                },
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data['access_token'], data.get('expires_in', 3600)
+        except Exception as e:
+            logger.error(f"获取 Spotify 访问令牌失败: {str(e)}")
+            return None, 0
+
+    def cached_token(self, expired_token=None):
+        """The current access token if it is not about to expire, else None; never blocks"""
+        token = self._access_token
+        if token and token != expired_token and time.time() < self._token_expiry - TOKEN_REFRESH_MARGIN:
+            return token
+        return None
+
+    def token(self, expired_token=None):
+        """Return a valid access token, refreshing it ahead of expiry
+
+        Only one thread refreshes at a time; the others wait on the lock and
+        then reuse the new token. `expired_token` forces a refresh after a 401,
+        unless another thread has already replaced that token.
+        """
+        token = self.cached_token(expired_token)
+        if token:
+            return token
+
+        with self._token_lock:
+            token = self.cached_token(expired_token)
+            if token:
+                return token
+
+            token, expires_in = self._get_access_token()
+            self._access_token = token
+            self._token_expiry = time.time() + expires_in if token else 0
+            if token:
+                logger.info(f"获取 Spotify 访问令牌成功, {expires_in} 秒后过期")
+            return token
+
+    def _get(self, path, params=None):
+        """GET an API path under the shared retry policy (see response_action)
+
+        Returns the decoded JSON body, or None when the request ultimately fails.
+        """
+        for attempt in range(MAX_RETRIES):
+            access_token = self.token()
+            if not access_token:
+                logger.error("无法获取 Spotify 访问令牌")
+                return None
+
+            try:
+                response = self.session.get(
+                    f"{self.api_base_url}{path}",
+                    params=params,
+                    headers={
+                        'Authorization': f'Bearer {access_token}'
+                    },
+                    timeout=self.timeout
+                )
+            except requests.exceptions.RequestException as e:
+                action, value = request_failed(e, attempt)
+            else:
+                action, value = response_action(response, attempt)
+
+            if action == DONE:
+                return value
+            if action == FAIL:
+                return None
+            if action == REFRESH_TOKEN:
+                self.token(expired_token=access_token)
+            elif attempt + 1 < MAX_RETRIES:
+                time.sleep(value)
+
+        logger.error(f"请求 Spotify API 失败，已达到最大重试次数: {path}")
+        return None
+
+    def _parse_track(self, track_data):
+        """Extract the album cover and a playable preview URL from a track object"""
+        # 获取最大尺寸的专辑封面
+        album_images = track_data.get('album', {}).get('images', [])
+        album_image_url = None
+        if album_images:
+            # 按宽度排序，获取最大的图片
+            album_image = max(album_images, key=lambda x: x.get('width') or 0)
+            album_image_url = album_image.get('url')
+
+        return {
+            'album_image_url': album_image_url,
+            'preview_url': track_data.get('preview_url')
+        }
+
+    def parse_tracks(self, chunk, data):
+        """{track_id: info or None} for one GET /tracks?ids= response"""
+        # Results come back in request order, with null for unknown ids
+        tracks = data.get('tracks', [])
+        return {
+            track_id: self._parse_track(tracks[i]) if i < len(tracks) and tracks[i] else None
+            for i, track_id in enumerate(chunk)
+        }
+
+    def check_preview(self, track_info):
+        """Hide preview URLs the background verifier has found to be unreachable
+
+        URLs that have not been verified yet are returned as-is while a check is queued.
+        """
+        if not track_info or not track_info.get('preview_url') or self.preview_verifier is None:
+            return track_info
+        if self.preview_verifier.is_playable(track_info['preview_url']) is False:
+            return {**track_info, 'preview_url': None}
+        return track_info
+
+    def get_track_info(self, track_id):
+        """获取歌曲详细信息"""
+        if self.cache is not None:
+            cached, _ = self.cache.get_many([track_id])
+            if track_id in cached:
+                return self.check_preview(cached[track_id])
+
+        track_data = self._get(f"/tracks/{track_id}")
+        if track_data is None:
+            logger.error(f"获取歌曲信息失败: {track_id}")
+            return None
+
+        track_info = self._parse_track(track_data)
+        if self.cache is not None:
+            self.cache.set_many({track_id: track_info})
+        logger.info(f"成功获取歌曲信息 - Track ID: {track_id}, "
+                    f"专辑封面: {'有' if track_info['album_image_url'] else '无'}, "
+                    f"预览: {'有' if track_info['preview_url'] else '无'}")
+        return self.check_preview(track_info)
+
+    def cached_tracks_info(self, track_ids):
+        """Split track ids into ({track_id: info} answered by the cache, ids still to fetch)"""
+        track_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+        if self.cache is None:
+            return {}, track_ids
+        track_infos, missing = self.cache.get_many(track_ids)
+        return {track_id: self.check_preview(info) for track_id, info in track_infos.items()}, missing
+
+    def fetch_tracks_info(self, track_ids):
+        """Fetch tracks from the API without consulting the cache, 50 ids per request
+
+        Returns {track_id: info or None}; results are written to the cache.
+        """
+        track_infos = {}
+        fetched = {}
+        for start in range(0, len(track_ids), MAX_IDS_PER_REQUEST):
+            chunk = track_ids[start:start + MAX_IDS_PER_REQUEST]
+            data = self._get('/tracks', params={'ids': ','.join(chunk)})
+            if data is None:
+                # Request failed; report the tracks as unresolved but don't cache that
+                track_infos.update(dict.fromkeys(chunk))
+                continue
+            fetched.update(self.parse_tracks(chunk, data))
+
+        if self.cache is not None and fetched:
+            self.cache.set_many(fetched)
+        track_infos.update(fetched)
+
+        if track_ids:
+            logger.info(f"批量获取歌曲信息: 请求 {len(track_ids)} 首, "
+                        f"成功 {sum(1 for info in fetched.values() if info)} 首")
+        return {track_id: self.check_preview(info) for track_id, info in track_infos.items()}
+
+    def get_tracks_info(self, track_ids):
+        """批量获取歌曲信息 via GET /tracks?ids=, 50 ids per request
+
+        Returns {track_id: info or None}; ids Spotify doesn't know, or whose
+        chunk failed, map to None.
+        """
+        track_infos, missing = self.cached_tracks_info(track_ids)
+        track_infos.update(self.fetch_tracks_info(missing))
+        return track_infos
@@ -0,0 +1,33 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# {stage: ms} of the current request, or None when timings are not being collected
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+def start_request():
+    """Collect stage timings for the current request (call once per request)"""
+    _stage_timings.set({})
+
+
+@contextmanager
+def timed_stage(name):
+    """Add the time spent in the block to the current request's stage `name`; no-op outside a request"""
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000.0
+
+
+def server_timing_header():
+    """Server-Timing header value for the stages recorded so far, e.g. 'decode;dur=4.1, inference;dur=38.0'"""
+    timings = _stage_timings.get()
+    if not timings:
+        return None
+    return ', '.join(f'{name};dur={ms:.2f}' for name, ms in timings.items())
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Compact, immutable representation of a catalog track
+Track = namedtuple('Track', ['uri', 'name', 'artist', 'album', 'duration_ms', 'tags'])
+
+# _failed_mtime before any load has failed; None is taken by "file missing"
+_NOT_FAILED = object()
+
+
+class TagVocabulary:
+    """Append-only mapping of lowercased tag -> integer id, shared by every snapshot
+
+    Ids never change across reloads, so tables precomputed against the
+    vocabulary (e.g. scene label -> tag ids) stay valid when tracks.json changes.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, tag):
+        """Id of a tag, or None if no track or table has used it"""
+        return self._ids.get(tag.lower())
+
+    def add(self, tag):
+        """Id of a tag, assigning the next id on first use"""
+        tag = tag.lower()
+        tag_id = self._ids.get(tag)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self._ids.setdefault(sys.intern(tag), len(self._ids))
+        return tag_id
+
+
+class CatalogSnapshot:
+    """Immutable view of tracks.json, shared by all requests
+
+    Tags are held as a sparse track x tag count matrix, stored tag-major (the
+    CSR form of its transpose): the tracks carrying tag id t are
+    tag_tracks[tag_indptr[t]:tag_indptr[t + 1]], with tag_counts occurrences each.
+    """
+    __slots__ = ('tracks', 'vocabulary', 'tag_indptr', 'tag_tracks', 'tag_counts', 'mtime', 'loaded_at')
+
+    def __init__(self, tracks, mtime, vocabulary):
+        self.tracks = tracks
+        self.vocabulary = vocabulary
+        self.tag_indptr, self.tag_tracks, self.tag_counts = _build_tag_matrix(tracks, vocabulary)
+        self.mtime = mtime
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def tag_weights(self, input_tags, weight=1.0):
+        """{tag id: weight} for the plain tags of a text query; tags unknown to the catalog are dropped"""
+        tag_ids = (self.vocabulary.get(tag) for tag in input_tags)
+        return {tag_id: weight for tag_id in tag_ids if tag_id is not None}
+
+    def scores(self, tag_weights):
+        """Score every track: the track x tag matrix times the query vector {tag id: weight}
+
+        Only the columns of the query's nonzero tags are gathered, but bincount
+        still fills a dense array of len(tracks) (and match's argpartition scans
+        it), so the cost is linear in catalog size, with a small vectorized
+        constant per track plus the length of the gathered postings.
+        """
+        n_tags = len(self.tag_indptr) - 1
+        tracks, weights = [], []
+        for tag_id, weight in tag_weights.items():
+            if tag_id >= n_tags:
+                continue  # added to the vocabulary after this snapshot was built
+            start, end = self.tag_indptr[tag_id], self.tag_indptr[tag_id + 1]
+            if start != end:
+                tracks.append(self.tag_tracks[start:end])
+                weights.append(self.tag_counts[start:end] * weight)
+        if not tracks:
+            return np.zeros(len(self.tracks))
+        return np.bincount(np.concatenate(tracks), weights=np.concatenate(weights),
+                           minlength=len(self.tracks))
+
+    def match(self, tag_weights, limit=12):
+        """Return up to `limit` (track, score, match_count, matched_tags) tuples with the highest score
+
+        tag_weights maps tag id -> weight; a track scores the weights of its tags.
+        Ties keep catalog order.
+        """
+        scores = self.scores(tag_weights)
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top_scores = scores[top]
+        kth = top_scores.min()
+        if kth <= 0:
+            top = top[top_scores > 0]  # fewer than limit tracks matched at all
+        else:
+            # argpartition picks arbitrary tracks among those tied at the cut; keep catalog order instead
+            tied = np.flatnonzero(scores == kth)
+            if len(tied) > np.count_nonzero(top_scores == kth):
+                above = top[top_scores > kth]
+                top = np.concatenate((above, tied[:limit - len(above)]))
+        top = top[np.lexsort((top, -scores[top]))]
+
+        results = []
+        for track_idx in top.tolist():
+            track = self.tracks[track_idx]
+            matched_tags = [tag for tag in track.tags if self.vocabulary.get(tag) in tag_weights]
+            # A tag counts once per occurrence, so match_count equals len(matched_tags)
+            results.append((track, float(scores[track_idx]), len(matched_tags), matched_tags))
+        return results
+
+
+class TrackCatalog:
+    """In-memory track catalog, loaded once and hot-reloaded when the file changes"""
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.vocabulary = TagVocabulary()
+        self.error = None
+        self._snapshot = None
+        self._last_check = 0.0
+        # mtime of the file version that failed to load, so it is not retried on every check
+        self._failed_mtime = _NOT_FAILED
+        self._reload_lock = threading.Lock()
+
+    def load(self):
+        """Load the catalog synchronously (used at startup)"""
+        with self._reload_lock:
+            self._reload()
+        self._last_check = time.monotonic()
+        return self._snapshot
+
+    def snapshot(self):
+        """Return the current snapshot, scheduling a reload if the file changed"""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._check_for_update()
+        return self._snapshot
+
+    def _check_for_update(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+
+        # Unchanged since the snapshot, or since the last failed load (None: the file is missing)
+        current = self._snapshot
+        if mtime == self._failed_mtime or (current is not None and mtime == current.mtime):
+            return
+
+        if not self._reload_lock.acquire(blocking=False):
+            return  # another thread is already reloading
+        threading.Thread(target=self._background_reload, daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            self._reload()
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self):
+        """Parse tracks.json and atomically swap in a new snapshot"""
+        start = time.perf_counter()
+        mtime = None
+        try:
+            # Stat inside the try: the file can disappear between checks
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.error(f"music data file does not exist: {self.path}")
+            self.error = 'music data file does not exist'
+            self._failed_mtime = None
+            return
+        except OSError as e:
+            logger.error(f"music data file could not be read: {str(e)}")
+            self.error = 'music data file could not be read'
+            self._failed_mtime = mtime
+            return
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.error(f"music data file format error: {str(e)}")
+            self.error = 'music data file format error'
+            self._failed_mtime = mtime
+            return
+
+        playlists = data.get('playlists') if isinstance(data, dict) else None
+        del data
+        try:
+            tracks = _build_tracks(playlists if isinstance(playlists, list) else [])
+            snapshot = CatalogSnapshot(tracks, mtime, self.vocabulary) if tracks else None
+        except Exception as e:
+            # Unexpected field types; keep serving the previous snapshot
+            logger.error(f"music data file format error: {str(e)}", exc_info=True)
+            self.error = 'music data file format error'
+            self._failed_mtime = mtime
+            return
+        del playlists
+
+        if snapshot is None:
+            logger.warning("music data file has no playlists")
+            self.error = 'no available music data'
+            self._failed_mtime = mtime
+            return
+
+        # Single reference assignment, so readers see either the old or the new snapshot
+        self._snapshot = snapshot
+        self.error = None
+        self._failed_mtime = _NOT_FAILED
+        logger.info(f"loaded {len(tracks)} unique tracks from {self.path} "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+
+def _build_tracks(playlists):
+    """Flatten playlists into unique Track tuples, keeping the first occurrence of each track_uri"""
+    seen_track_uris = set()
+    tracks = []
+    for playlist in playlists:
+        if not isinstance(playlist, dict):
+            continue
+        playlist_tracks = playlist.get('tracks') or []
+        if not isinstance(playlist_tracks, list):
+            continue
+        for track in playlist_tracks:
+            if not isinstance(track, dict):
+                continue
+
+            track_uri = track.get('track_uri')
+            if not isinstance(track_uri, str) or not track_uri or track_uri in seen_track_uris:
+                continue
+            seen_track_uris.add(track_uri)
+
+            tags = track.get('tags') or []
+            if not isinstance(tags, list):
+                tags = []
+            tracks.append(Track(
+                uri=track_uri,
+                name=track.get('track_name', ''),
+                artist=track.get('artist_name', ''),
+                album=track.get('album_name', ''),
+                duration_ms=track.get('duration_ms', 0),
+                # Tags repeat across the whole catalog, interning keeps one copy of each
+                tags=tuple(sys.intern(tag) for tag in tags if isinstance(tag, str)),
+            ))
+    return tuple(tracks)
+
+
+def _build_tag_matrix(tracks, vocabulary):
+    """Build the tag-major sparse matrix: (indptr by tag id, track positions, occurrence counts)"""
+    track_ids = array('I')
+    tag_ids = array('I')
+    for track_idx, track in enumerate(tracks):
+        for tag in track.tags:
+            track_ids.append(track_idx)
+            tag_ids.append(vocabulary.add(tag))
+
+    # Sort entries by (tag, track) and merge repeated tags of a track into one count
+    n_tracks = max(len(tracks), 1)
+    keys, counts = np.unique(np.frombuffer(tag_ids, dtype=np.uint32).astype(np.int64) * n_tracks
+                             + np.frombuffer(track_ids, dtype=np.uint32), return_counts=True)
+    entry_tags = keys // n_tracks
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(entry_tags, minlength=len(vocabulary)), out=indptr[1:])
+    return indptr, (keys % n_tracks).astype(np.int32), counts.astype(np.float32)
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TrackMetadataCache:
+    """Bounded TTL + LRU cache of Spotify track metadata keyed by track id
+
+    Entries whose value is None (unknown track) or that have no preview URL are
+    negative entries and expire after `negative_ttl`. When `path` is given, entries
+    are written through to a sqlite file so the cache survives restarts.
+    """
+
+    def __init__(self, max_size=10000, ttl=86400, negative_ttl=3600, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # track_id -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open_db(path)
+            if hasattr(os, 'register_at_fork'):
+                # sqlite connections must not be used across fork (gunicorn --preload)
+                os.register_at_fork(after_in_child=lambda: self._open_db(path))
+
+    def _open_db(self, path):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS track_metadata '
+                '(track_id TEXT PRIMARY KEY, expires_at REAL, value TEXT)'
+            )
+            self._db.execute('DELETE FROM track_metadata WHERE expires_at < ?', (time.time(),))
+            self._db.commit()
+            logger.info(f"track metadata cache persisted to {path}")
+        except sqlite3.Error as e:
+            logger.error(f"failed to open track metadata cache {path}: {str(e)}")
+            self._db = None
+
+    def _is_negative(self, value):
+        return value is None or not value.get('preview_url')
+
+    def get_many(self, track_ids):
+        """Return ({track_id: value} for cached ids, [ids that must be fetched])"""
+        found = {}
+        missing = []
+        now = time.time()
+        with self._lock:
+            for track_id in track_ids:
+                entry = self._entries.get(track_id)
+                if entry is not None and entry[0] < now:
+                    del self._entries[track_id]
+                    entry = None
+                if entry is None and self._db is not None:
+                    entry = self._load(track_id, now)
+                if entry is None:
+                    self.misses += 1
+                    missing.append(track_id)
+                    continue
+                self._entries.move_to_end(track_id)
+                self.hits += 1
+                found[track_id] = entry[1]
+        return found, missing
+
+    def set_many(self, track_infos):
+        """Cache {track_id: value}, evicting least recently used entries beyond max_size"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for track_id, value in track_infos.items():
+                ttl = self.negative_ttl if self._is_negative(value) else self.ttl
+                entry = (now + ttl, value)
+                self._insert(track_id, entry)
+                rows.append((track_id, entry[0], json.dumps(value)))
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany('INSERT OR REPLACE INTO track_metadata VALUES (?, ?, ?)', rows)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"failed to persist track metadata: {str(e)}")
+
+    def _insert(self, track_id, entry):
+        self._entries[track_id] = entry
+        self._entries.move_to_end(track_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, track_id, now):
+        """Promote a still-valid on-disk entry into memory"""
+        try:
+            row = self._db.execute(
+                'SELECT expires_at, value FROM track_metadata WHERE track_id = ?', (track_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"failed to read track metadata cache: {str(e)}")
+            return None
+        if row is None or row[0] < now:
+            return None
+        entry = (row[0], json.loads(row[1]))
+        self._insert(track_id, entry)
+        return entry
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'persistent': self._db is not None
+        }